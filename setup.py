@@ -15,8 +15,15 @@ setup(
         license="GNU GENERAL PUBLIC",
         install_requires=[
             "gpiozero",
+            "numpy",
             "rpi_ws281x",
         ],
+        extras_require={
+            "alsa": ["pyalsaaudio"],
+        },
         packages=find_packages(where="src"),
         package_dir={"":"src"},
+        entry_points={
+            "console_scripts": ["disco-tie-benchmark=disco_tie.benchmark:main"],
+        },
 )
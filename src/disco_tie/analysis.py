@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+
+from disco_tie.audio import SAMPLE_RATE
+
+ONSET_HISTORY = 43
+BEAT_HISTORY = 16
+
+
+class AudioAnalyser:
+    #per frame audio features. every table and buffer is built here so update() doesn't allocate
+    def __init__(self, sample_rate=SAMPLE_RATE, window=1024, band_count=24, led_count=72,
+                 min_freq=40, max_freq=11000, attack=0.01, release=0.3, onset_threshold=1.5,
+                 min_beat_interval=0.25, peak_decay=0.995):
+        self.sample_rate = sample_rate
+        self.window = window
+        self.attack = attack
+        self.release = release
+        self.onset_threshold = onset_threshold
+        self.min_beat_interval = min_beat_interval
+        self.peak_decay = peak_decay
+
+        bins = window // 2 + 1
+        self._window_fn = np.hanning(window).astype(np.float32)
+        self._windowed = np.empty(window, dtype=np.float32)
+        self.magnitude = np.zeros(bins, dtype=np.float32)
+        self._previous_magnitude = np.zeros(bins, dtype=np.float32)
+        self._flux = np.empty(bins, dtype=np.float32)
+
+        self.set_band_count(band_count, led_count, min_freq, min(max_freq, sample_rate / 2))
+
+        self.rms = 0.0
+        self.envelope = 0.0
+        self.onset = False
+        self.beat = False
+        self.bpm = 0.0
+        self.flux = 0.0
+        self._flux_history = np.zeros(ONSET_HISTORY, dtype=np.float32)
+        self._flux_count = 0
+        self._beat_times = np.zeros(BEAT_HISTORY, dtype=np.float64)
+        self._beat_count = 0
+        self._intervals = np.empty(BEAT_HISTORY - 1, dtype=np.float64)
+        self._last_time = None
+
+    def set_band_count(self, band_count, led_count=None, min_freq=None, max_freq=None):
+        #log spaced band edges as fft bin indices, every band gets at least one bin
+        if min_freq is not None:
+            self.min_freq = min_freq
+        if max_freq is not None:
+            self.max_freq = max_freq
+        bins = len(self.magnitude)
+        freqs = np.geomspace(self.min_freq, self.max_freq, band_count + 1)
+        edges = np.round(freqs * self.window / self.sample_rate).astype(np.intp)
+        edges[0] = max(edges[0], 1)
+        for i in range(1, len(edges)):
+            edges[i] = max(edges[i], edges[i - 1] + 1)
+        edges = np.minimum(edges, bins)
+        self.band_count = band_count
+        self.band_edges = edges
+        self._band_starts = edges[:-1].copy()
+        self._band_widths = np.maximum(np.diff(edges), 1).astype(np.float32)
+        self._band_sums = np.empty(band_count, dtype=np.float32)
+        self._band_peak = np.full(band_count, 1e-3, dtype=np.float32)
+        self.bands = np.zeros(band_count, dtype=np.float32)
+        if led_count is not None:
+            self.led_count = led_count
+        #which band each LED shows, so effects can gather band levels across the whole strip
+        self.band_for_led = (np.arange(self.led_count) * band_count // self.led_count).astype(np.intp)
+
+    def update(self, samples, now):
+        if len(samples) < self.window:
+            return
+        samples = samples[-self.window:]
+        dt = 0.0 if self._last_time is None else now - self._last_time
+        self._last_time = now
+
+        #rms envelope with separate attack and release time constants
+        self.rms = math.sqrt(float(np.dot(samples, samples)) / self.window)
+        time_constant = self.attack if self.rms > self.envelope else self.release
+        if time_constant > 0:
+            self.envelope += (self.rms - self.envelope) * (1 - math.exp(-dt / time_constant))
+        else:
+            self.envelope = self.rms
+
+        np.multiply(samples, self._window_fn, out=self._windowed)
+        #rfft only takes out= from numpy 2.0, and raspberry pi os ships 1.x
+        spectrum = np.fft.rfft(self._windowed)
+        self._previous_magnitude, self.magnitude = self.magnitude, self._previous_magnitude
+        np.abs(spectrum, out=self.magnitude)
+
+        #band energies, log compressed and normalised against a slowly decaying peak
+        np.add.reduceat(self.magnitude, self._band_starts, out=self._band_sums)
+        np.divide(self._band_sums, self._band_widths, out=self._band_sums)
+        np.log1p(self._band_sums, out=self._band_sums)
+        np.multiply(self._band_peak, self.peak_decay, out=self._band_peak)
+        np.maximum(self._band_peak, self._band_sums, out=self._band_peak)
+        np.divide(self._band_sums, self._band_peak, out=self.bands)
+
+        self._detect_onset(now)
+
+    def _detect_onset(self, now):
+        #spectral flux against an adaptive threshold from the last second or so of frames
+        np.subtract(self.magnitude, self._previous_magnitude, out=self._flux)
+        np.maximum(self._flux, 0, out=self._flux)
+        self.flux = float(self._flux.sum())
+        history = self._flux_history[:min(self._flux_count, ONSET_HISTORY)]
+        if len(history) > 4:
+            threshold = float(history.mean()) + self.onset_threshold * float(history.std())
+            self.onset = self.flux > threshold and self.flux > 1e-3
+        else:
+            self.onset = False
+        self._flux_history[self._flux_count % ONSET_HISTORY] = self.flux
+        self._flux_count += 1
+
+        self.beat = False
+        if not self.onset:
+            return
+        if self._beat_count and now - self._beat_times[(self._beat_count - 1) % BEAT_HISTORY] < self.min_beat_interval:
+            return
+        self.beat = True
+        self._beat_times[self._beat_count % BEAT_HISTORY] = now
+        self._beat_count += 1
+        self._estimate_bpm()
+
+    def _estimate_bpm(self):
+        count = min(self._beat_count, BEAT_HISTORY)
+        if count < 3:
+            return
+        intervals = self._intervals[:count - 1]
+        if self._beat_count <= BEAT_HISTORY:
+            np.subtract(self._beat_times[1:count], self._beat_times[:count - 1], out=intervals)
+        else:
+            start = self._beat_count % BEAT_HISTORY
+            ordered = np.roll(self._beat_times, -start)
+            np.subtract(ordered[1:], ordered[:-1], out=intervals)
+        bpm = 60 / float(np.median(intervals))
+        #fold into a danceable range
+        while bpm < 70:
+            bpm *= 2
+        while bpm > 180:
+            bpm /= 2
+        self.bpm = bpm
+
+    def led_levels(self, out):
+        #band level for every LED, written into out
+        return np.take(self.bands, self.band_for_led, out=out)
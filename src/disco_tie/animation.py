@@ -0,0 +1,82 @@
+import math
+
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1 - (1 - t) * (1 - t),
+    "ease_in_out": lambda t: t * t * (3 - 2 * t),
+    "sine": lambda t: 0.5 - math.cos(t * math.pi) / 2,
+}
+
+
+class Tween:
+    #moves one attribute of target to end over duration seconds
+    def __init__(self, target, attribute, end, duration, easing="ease_in_out", on_complete=None):
+        if easing not in EASINGS:
+            raise ValueError(f"Unknown easing {easing}, should be one of {tuple(EASINGS)}")
+        self.target = target
+        self.attribute = attribute
+        self.start = getattr(target, attribute)
+        self.end = end
+        self.duration = duration
+        self.easing = EASINGS[easing]
+        self.on_complete = on_complete
+        self.elapsed = 0.0
+
+    @property
+    def progress(self):
+        return min(self.elapsed / self.duration, 1.0) if self.duration > 0 else 1.0
+
+    def step(self, dt):
+        #returns True once the tween has finished
+        self.elapsed += dt
+        progress = self.progress
+        setattr(self.target, self.attribute, self.start + (self.end - self.start) * self.easing(progress))
+        if progress >= 1.0:
+            if self.on_complete is not None:
+                self.on_complete()
+            return True
+        return False
+
+    def finish(self):
+        self.elapsed = self.duration
+        self.step(0.0)
+
+
+class Animator:
+    #runs tweens off the frame deltatime so they take the same time at any framerate.
+    #at most max_tweens run at once, starting another finishes the oldest, so the cost per frame is bounded
+    def __init__(self, max_tweens=16):
+        self.max_tweens = max_tweens
+        self.tweens = {}
+
+    def tween(self, target, attribute, end, duration, easing="ease_in_out", on_complete=None):
+        key = (id(target), attribute)
+        #a new tween on the same attribute carries on from wherever the old one had got to
+        self.tweens.pop(key, None)
+        tween = Tween(target, attribute, end, duration, easing, on_complete)
+        if duration <= 0:
+            tween.finish()
+            return tween
+        if len(self.tweens) >= self.max_tweens:
+            oldest = next(iter(self.tweens))
+            self.tweens.pop(oldest).finish()
+        self.tweens[key] = tween
+        return tween
+
+    def update(self, dt):
+        if not self.tweens:
+            return
+        for key, tween in list(self.tweens.items()):
+            if tween.step(dt):
+                self.tweens.pop(key, None)
+
+    def finish_all(self):
+        #jumps every running tween to its end, running their on_complete callbacks
+        tweens = list(self.tweens.values())
+        self.tweens.clear()
+        for tween in tweens:
+            tween.finish()
+
+    def is_animating(self, target, attribute):
+        return (id(target), attribute) in self.tweens
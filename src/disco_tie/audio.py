@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 22050
+BLOCK_SIZE = 512
+
+
+class RingBuffer:
+    #single writer, single reader. every sample is stored twice, at i and i + capacity,
+    #so the most recent window is always one contiguous slice and can be handed out as a view
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros(capacity * 2, dtype=dtype)
+        self.written = 0
+
+    def write(self, samples):
+        capacity = self.capacity
+        if len(samples) > capacity:
+            samples = samples[-capacity:]
+        count = len(samples)
+        start = self.written % capacity
+        first = min(count, capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[start + capacity:start + capacity + first] = samples[:first]
+        rest = count - first
+        if rest:
+            self._data[:rest] = samples[first:]
+            self._data[capacity:capacity + rest] = samples[first:]
+        #only publish the new position once the samples are in place
+        self.written += count
+
+    def latest(self, count):
+        if count > self.capacity:
+            raise ValueError(f"Can't read {count} samples from a ring buffer of {self.capacity}")
+        end = self.written % self.capacity + self.capacity
+        return self._data[end - count:end]
+
+
+class SyntheticSource:
+    #a kick on every beat, a hi-hat on the off beats and a slowly sweeping tone
+    blocking = False
+
+    def __init__(self, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, bpm=120, seed=0):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.bpm = bpm
+        self._rng = np.random.default_rng(seed)
+        self._position = 0
+
+    def read(self):
+        t = (self._position + np.arange(self.block_size)) / self.sample_rate
+        self._position += self.block_size
+        beat_length = 60 / self.bpm
+        since_beat = t % beat_length
+        since_offbeat = (t + beat_length / 2) % beat_length
+        kick = np.sin(2 * math.pi * 55 * since_beat) * np.exp(-since_beat * 18)
+        hihat = self._rng.standard_normal(self.block_size) * np.exp(-since_offbeat * 60) * 0.2
+        sweep = np.sin(2 * math.pi * (400 + 300 * np.sin(t * 0.5)) * t) * 0.1
+        return (kick + hihat + sweep).astype(np.float32)
+
+
+class WavSource:
+    #plays a wav file (mixed down to mono) on a loop
+    blocking = False
+
+    def __init__(self, path, block_size=BLOCK_SIZE, loop=True):
+        with wave.open(path, "rb") as f:
+            self.sample_rate = f.getframerate()
+            channels = f.getnchannels()
+            width = f.getsampwidth()
+            frames = f.readframes(f.getnframes())
+        if width == 1:
+            samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+        elif width == 4:
+            samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+        else:
+            raise ValueError(f"Unsupported wav sample width: {width} bytes")
+        self.samples = samples.reshape(-1, channels).mean(axis=1).astype(np.float32)
+        self.block_size = block_size
+        self.loop = loop
+        self._position = 0
+
+    def read(self):
+        start = self._position
+        end = start + self.block_size
+        if end <= len(self.samples):
+            self._position = end
+            return self.samples[start:end]
+        if not self.loop:
+            self._position = len(self.samples)
+            return np.zeros(self.block_size, dtype=np.float32)
+        self._position = end - len(self.samples)
+        return np.concatenate((self.samples[start:], self.samples[:self._position]))
+
+
+class AlsaSource:
+    #microphone capture, needs the optional pyalsaaudio package
+    blocking = True
+
+    def __init__(self, device="default", sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE):
+        import alsaaudio
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.pcm = alsaaudio.PCM(alsaaudio.PCM_CAPTURE, alsaaudio.PCM_NORMAL, device=device,
+                                 channels=1, rate=sample_rate, format=alsaaudio.PCM_FORMAT_S16_LE,
+                                 periodsize=block_size)
+
+    def read(self):
+        length, data = self.pcm.read()
+        if length <= 0:
+            #overrun, drop the block
+            return np.zeros(0, dtype=np.float32)
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768
+
+
+class AudioCapture:
+    #reads the source on its own thread so a slow read can never hold up a frame
+    def __init__(self, source, buffer_seconds=1.0):
+        self.source = source
+        self.sample_rate = source.sample_rate
+        self.buffer = RingBuffer(int(source.sample_rate * buffer_seconds))
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._capture, name="audio-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _capture(self):
+        next_block = time.monotonic()
+        while self.running:
+            block = self.source.read()
+            self.buffer.write(block)
+            if not self.source.blocking:
+                #files and generated signals are paced to real time here
+                next_block += len(block) / self.sample_rate
+                delay = next_block - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_block = time.monotonic()
+
+    def latest(self, count):
+        return self.buffer.latest(count)
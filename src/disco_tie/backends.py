@@ -0,0 +1,93 @@
+import sys
+import time
+
+import numpy as np
+
+
+class FakeStrip:
+    #stands in for rpi_ws281x.Adafruit_NeoPixel on machines without the LED hardware
+    def __init__(self, led_count, *args, **kwargs):
+        self.leds = np.zeros(led_count, dtype=np.uint32)
+        self.brightness = 255
+        self.show_count = 0
+
+    def begin(self):
+        pass
+
+    def show(self):
+        self.show_count += 1
+
+    def setPixelColor(self, n, color):
+        self.leds[n] = color
+
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.leds[n] = (white << 24) | (red << 16) | (green << 8) | blue
+
+    def getPixelColor(self, n):
+        return int(self.leds[n])
+
+    def getPixels(self):
+        return self.leds
+
+    def numPixels(self):
+        return len(self.leds)
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+
+    def getBrightness(self):
+        return self.brightness
+
+
+class NullStrip(FakeStrip):
+    #accepts frames and throws them away
+    pass
+
+
+class WireTimeStrip(NullStrip):
+    #takes as long to show() as a real ws281x strip takes to clock the data out.
+    #with dma=True it behaves like ws2811_render instead: show() only waits for the last transfer to finish,
+    #then starts the next one and returns while it's still clocking out
+    def __init__(self, led_count, *args, led_time=30e-6, reset_time=300e-6, dma=False, **kwargs):
+        super().__init__(led_count)
+        self.led_time = led_time
+        self.reset_time = reset_time
+        self.dma = dma
+        self._done = 0.0
+
+    def show(self):
+        super().show()
+        wire_time = len(self.leds) * self.led_time + self.reset_time
+        if not self.dma:
+            time.sleep(wire_time)
+            return
+        time.sleep(max(self._done - time.monotonic(), 0))
+        self._done = time.monotonic() + wire_time
+
+
+class RecordingStrip(FakeStrip):
+    def __init__(self, led_count, *args, max_frames=None, **kwargs):
+        super().__init__(led_count)
+        self.max_frames = max_frames
+        self.frames = []
+
+    def show(self):
+        super().show()
+        self.frames.append(self.leds.copy())
+        if self.max_frames is not None and len(self.frames) > self.max_frames:
+            del self.frames[0]
+
+
+class AnsiStrip(FakeStrip):
+    #previews the strip as a row of coloured blocks in a truecolor terminal
+    def __init__(self, led_count, *args, stream=None, **kwargs):
+        super().__init__(led_count)
+        self.stream = stream if stream is not None else sys.stdout
+
+    def show(self):
+        super().show()
+        blocks = []
+        for word in self.leds.tolist():
+            blocks.append(f"\x1b[38;2;{(word >> 16) & 255};{(word >> 8) & 255};{word & 255}m█")
+        self.stream.write("\r" + "".join(blocks) + "\x1b[0m")
+        self.stream.flush()
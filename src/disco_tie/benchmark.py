@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from functools import partial
+
+import numpy as np
+
+from disco_tie.analysis import AudioAnalyser
+from disco_tie.audio import SyntheticSource
+from disco_tie.backends import FakeStrip, NullStrip, WireTimeStrip
+from disco_tie.drawer import LightStrip
+from disco_tie.effects import Plasma, Shimmer
+from disco_tie.manager import Manager, color_wheel
+from disco_tie.multistrip import MultiStrip
+from disco_tie.network import NetworkInput, NetworkSender
+from disco_tie.noise import PerlinNoise
+from disco_tie.palette import PALETTES
+from disco_tie.output import PixelOutput
+
+LED_COUNTS = (72, 300, 1000)
+STAGES = ("_get_inputs", "_get_audio", "update", "_draw")
+FRAME_BUDGET = 1 / 30
+#runs in a fresh interpreter so import costs are measured cold. the boot frame goes to a stub strip,
+#anything from disco_tie.backends would pull numpy in before it
+STARTUP_SCRIPT = """
+import time
+start = time.monotonic()
+import json, sys
+from disco_tie.boot import StartupTimer, WarmUp, boot_frame, show_boot_frame
+
+class BootStrip:
+    def begin(self):
+        pass
+
+    def setPixelColor(self, n, color):
+        pass
+
+    def show(self):
+        pass
+
+led_count, mode = int(sys.argv[1]), sys.argv[2]
+startup = StartupTimer(start)
+if mode == "boot":
+    show_boot_frame(BootStrip(), boot_frame(led_count))
+    startup.mark("boot frame")
+    warm_up = WarmUp()
+    warm_up.start()
+    warm_up.wait()
+    startup.mark("warm up")
+from disco_tie.backends import NullStrip
+from disco_tie.manager import Manager
+from disco_tie.settings import SettingsStore
+startup.mark("imports")
+manager = Manager(led_count=led_count, strip=NullStrip(led_count), settings=SettingsStore(path=None), startup=startup)
+manager.update()
+manager._draw()
+startup.mark("first frame")
+print(json.dumps(startup.marks))
+"""
+
+
+def _color(red, green, blue):
+    return (red << 16) | (green << 8) | blue
+
+
+def _time_frames(func, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        func()
+    return (time.perf_counter() - start) / frames
+
+
+def bench_upload(led_counts=LED_COUNTS, frames=200):
+    for led_count in led_counts:
+        rgb = np.random.default_rng(0).random((led_count, 3), dtype=np.float32)
+        strip = FakeStrip(led_count)
+        output = PixelOutput(strip, led_count)
+
+        def per_pixel():
+            for i, pixel in enumerate(rgb.tolist()):
+                final_pixel = tuple(int(subpixel * 255) for subpixel in pixel)
+                strip.setPixelColor(i, _color(final_pixel[0], final_pixel[1], final_pixel[2]))
+
+        def bulk():
+            output.pack(rgb)
+            output.upload()
+
+        old = _time_frames(per_pixel, frames)
+        new = _time_frames(bulk, frames)
+        print(f"upload  leds={led_count:5d}  per-pixel {old * 1000:8.3f} ms  bulk {new * 1000:8.3f} ms  ({old / new:.1f}x)")
+
+
+def bench_analysis(led_counts=LED_COUNTS, frames=200):
+    source = SyntheticSource(block_size=1024)
+    blocks = [source.read() for _ in range(frames)]
+    for led_count in led_counts:
+        analyser = AudioAnalyser(window=1024, led_count=led_count)
+        levels = np.empty(led_count, dtype=np.float32)
+        start = time.perf_counter()
+        for i, block in enumerate(blocks):
+            analyser.update(block, i * len(block) / source.sample_rate)
+            analyser.led_levels(levels)
+        cost = (time.perf_counter() - start) / frames
+        print(f"analysis  leds={led_count:5d}  {cost * 1000:7.3f} ms/frame  "
+              f"{cost / FRAME_BUDGET * 100:5.1f}% of a 30 fps frame  bpm {analyser.bpm:5.1f}")
+
+
+def bench_palette(led_counts=LED_COUNTS, frames=200):
+    palette = PALETTES["wheel"]
+    for led_count in led_counts:
+        positions = np.arange(led_count, dtype=np.float32) / led_count + 0.123
+        colors = np.empty((led_count, 3), dtype=np.float32)
+
+        def per_pixel():
+            for i in range(led_count):
+                colors[i] = color_wheel(i / led_count + 0.123)
+
+        old = _time_frames(per_pixel, frames)
+        nearest = _time_frames(lambda: palette.sample(positions, colors, interpolate=False), frames)
+        smooth = _time_frames(lambda: palette.sample(positions, colors), frames)
+        print(f"palette  leds={led_count:5d}  color_wheel {old * 1000:7.3f} ms  lut {nearest * 1000:7.3f} ms  "
+              f"lut+interp {smooth * 1000:7.3f} ms  ({old / smooth:.1f}x)")
+
+
+def _timed(func, timings, name):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] += time.perf_counter() - start
+        return result
+    return wrapper
+
+
+def run_headless(manager, frames, framerate=float("inf")):
+    #runs the real main loop, unthrottled by default, until the given number of frames have been drawn
+    timings = {name: 0.0 for name in STAGES}
+    for name in STAGES:
+        setattr(manager, name, _timed(getattr(manager, name), timings, name))
+    draw = manager._draw
+    frame_count = 0
+
+    def counted_draw():
+        nonlocal frame_count
+        draw()
+        frame_count += 1
+        if frame_count >= frames:
+            manager.running = False
+
+    manager._draw = counted_draw
+    manager.governor.enabled = False
+    manager.framerate = framerate
+    start = time.perf_counter()
+    manager.run()
+    elapsed = time.perf_counter() - start
+    return timings, elapsed
+
+
+def bench_frames(led_counts=LED_COUNTS, frames=200):
+    for led_count in led_counts:
+        manager = Manager(led_count=led_count, strip=NullStrip(led_count))
+        timings, elapsed = run_headless(manager, frames)
+        stages = "  ".join(f"{name} {timings[name] / frames * 1000:7.3f} ms" for name in STAGES)
+        print(f"frames  leds={led_count:5d}  {stages}  fps {frames / elapsed:8.1f}")
+
+
+def bench_pipeline(led_counts=LED_COUNTS, frames=200, framerate=60):
+    #both run at the same target framerate against a strip that takes as long to show as real hardware
+    for led_count in led_counts:
+        manager = Manager(led_count=led_count, strip=WireTimeStrip(led_count), audio_source=SyntheticSource())
+        timings, elapsed = run_headless(manager, frames, framerate)
+        manager.audio.stop()
+        latency = timings["_draw"] / frames
+        print(f"pipeline  leds={led_count:5d}  single     render {frames / elapsed:7.1f} fps  "
+              f"shown {frames / elapsed:7.1f} fps  latency {latency * 1000:6.2f} ms")
+
+        manager = Manager(led_count=led_count, pipelined=True, audio_source=SyntheticSource(),
+                          strip_factory=partial(WireTimeStrip, led_count))
+        timings, elapsed = run_headless(manager, frames, framerate)
+        pipeline = manager.pipeline
+        print(f"pipeline  leds={led_count:5d}  pipelined  render {frames / elapsed:7.1f} fps  "
+              f"shown {pipeline.frames_shown / elapsed:7.1f} fps  latency {pipeline.mean_latency * 1000:6.2f} ms")
+
+
+def bench_outputs(led_counts=LED_COUNTS, frames=200, max_outputs=3):
+    #the same canvas split over more data lines. each stands in for ws2811_render, which waits for its
+    #last transfer and returns once the next one is started, so the lines clock out at the same time
+    for led_count in led_counts:
+        rgb = np.random.default_rng(0).random((frames, led_count, 3), dtype=np.float32)
+        for output_count in range(1, max_outputs + 1):
+            counts = [len(part) for part in np.array_split(np.arange(led_count), output_count)]
+            strip = MultiStrip([WireTimeStrip(count, dma=True) for count in counts])
+            drawer = LightStrip(led_count=led_count, overall_brightness=1.0, strip=strip, dither=False)
+            frame = 0
+
+            def draw():
+                nonlocal frame
+                drawer.layers[0].pixels[:, :3] = rgb[frame]
+                drawer.layers[0].mark_dirty()
+                drawer.draw()
+                frame += 1
+
+            cost = _time_frames(draw, frames)
+            print(f"outputs  leds={led_count:5d}  outputs {output_count}  {cost * 1000:7.3f} ms/frame  "
+                  f"max {1 / cost:7.1f} fps")
+
+
+def bench_network(led_counts=LED_COUNTS, frames=200, framerate=60, protocol="e131"):
+    #everything runs over localhost, so this measures the decoding and the main loop, not a real network
+    for led_count in led_counts:
+        receiver = NetworkInput(led_count, protocol=protocol, host="127.0.0.1", port=0)
+        sender = NetworkSender(led_count, protocol=protocol, port=receiver.port)
+        rgb = np.random.default_rng(0).random((16, led_count, 3), dtype=np.float32)
+        pixels = np.zeros((led_count, 3), dtype=np.float32)
+
+        #throughput: send and decode frames back to back
+        start = time.perf_counter()
+        for i in range(frames):
+            sender.send(rgb[i % len(rgb)])
+            receiver.poll(pixels)
+        elapsed = time.perf_counter() - start
+        packets = receiver.packets
+
+        #latency: a sender thread at the given framerate, the real main loop showing whatever arrived
+        manager = Manager(led_count=led_count, strip=NullStrip(led_count), network=receiver)
+        latencies = []
+        show = manager.drawer.strip.show
+
+        def timed_show():
+            show()
+            if receiver.updated:
+                latencies.append(time.monotonic() - sender.sent_at[receiver.last_sequence & 255])
+
+        manager.drawer.strip.show = timed_show
+        thread = threading.Thread(target=_send_frames, args=(sender, rgb, frames, framerate))
+        thread.start()
+        run_headless(manager, frames, framerate * 2)
+        thread.join()
+        receiver.close()
+        sender.close()
+        print(f"network  leds={led_count:5d}  {protocol}  {packets / elapsed:8.0f} packets/s  "
+              f"{frames / elapsed:7.0f} frames/s  dropped {receiver.dropped}  "
+              f"latency to show mean {np.mean(latencies) * 1000:6.2f} ms  max {np.max(latencies) * 1000:6.2f} ms")
+
+
+def _send_frames(sender, rgb, frames, framerate):
+    deadline = time.monotonic()
+    for i in range(frames):
+        sender.send(rgb[i % len(rgb)])
+        deadline += 1 / framerate
+        time.sleep(max(deadline - time.monotonic(), 0))
+
+
+def bench_startup(led_counts=LED_COUNTS, runs=5):
+    #median time from interpreter start to each step, for the old import-everything-first order and with a boot frame
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for led_count in led_counts:
+        for mode in ("eager", "boot"):
+            results = []
+            for _ in range(runs):
+                output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, str(led_count), mode], env=env,
+                                        capture_output=True, text=True, check=True).stdout
+                results.append(json.loads(output.splitlines()[-1]))
+            marks = "  ".join(f"{name} {np.median([result[name] for result in results]) * 1000:7.1f} ms"
+                              for name in results[0])
+            print(f"startup  leds={led_count:5d}  {mode:5s}  {marks}")
+
+
+def bench_noise(led_counts=LED_COUNTS, frames=200):
+    noise = PerlinNoise(0)
+    analyser = AudioAnalyser(led_count=max(led_counts))
+    for led_count in led_counts:
+        x = np.linspace(0.0, 8.0, led_count, dtype=np.float32)
+        y = x * 0.5
+        pixels = np.empty((led_count, 3), dtype=np.float32)
+        plasma = Plasma(led_count, seed=0)
+        shimmer = Shimmer(led_count, seed=0)
+        costs = {
+            "noise1": _time_frames(lambda: noise.noise1(x + 0.5), frames),
+            "noise2": _time_frames(lambda: noise.noise2(x, 0.5), frames),
+            "noise3": _time_frames(lambda: noise.noise3(x, y, 0.5), frames),
+            "fbm3 x4": _time_frames(lambda: noise.fbm(x, y, 0.5, octaves=4), frames),
+            "plasma": _time_frames(lambda: plasma.render(pixels, analyser, FRAME_BUDGET), frames),
+            "shimmer": _time_frames(lambda: shimmer.render(pixels, analyser, FRAME_BUDGET), frames),
+        }
+        results = "  ".join(f"{name} {cost * 1000:6.3f} ms" for name, cost in costs.items())
+        print(f"noise  leds={led_count:5d}  {results}  fbm3 x4 is {costs['fbm3 x4'] / FRAME_BUDGET * 100:4.1f}% "
+              f"of a 30 fps frame")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="disco tie benchmarks")
+    parser.add_argument("bench", choices=["analysis", "frames", "network", "noise", "outputs", "palette", "pipeline", "startup",
+                                          "upload"])
+    parser.add_argument("-n", "--frames", type=int, default=200, help="frames to run per measurement")
+    parser.add_argument("-f", "--framerate", type=float, default=60, help="target framerate for the pipeline and network benchmarks")
+    parser.add_argument("-l", "--leds", type=int, nargs="+", default=list(LED_COUNTS), help="led counts to test")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="fresh interpreters per startup measurement")
+    args = parser.parse_args(argv)
+    if args.bench == "analysis":
+        bench_analysis(args.leds, args.frames)
+    elif args.bench == "frames":
+        bench_frames(args.leds, args.frames)
+    elif args.bench == "network":
+        bench_network(args.leds, args.frames, args.framerate)
+        bench_network(args.leds, args.frames, args.framerate, protocol="raw")
+    elif args.bench == "noise":
+        bench_noise(args.leds, args.frames)
+    elif args.bench == "outputs":
+        bench_outputs(args.leds, args.frames)
+    elif args.bench == "palette":
+        bench_palette(args.leds, args.frames)
+    elif args.bench == "pipeline":
+        bench_pipeline(args.leds, args.frames, args.framerate)
+    elif args.bench == "startup":
+        bench_startup(args.leds, args.runs)
+    elif args.bench == "upload":
+        bench_upload(args.leds, args.frames)
+
+
+if __name__ == "__main__":
+    main()
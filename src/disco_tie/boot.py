@@ -0,0 +1,82 @@
+import importlib
+import logging
+import threading
+import time
+import weakref
+
+#this module is imported before anything else at power on, so it must stay free of numpy and the rest of the render stack
+
+logger = logging.getLogger(__name__)
+
+#dim warm white on the knot while everything else loads, as 0x00RRGGBB words
+BOOT_COLOR = 0x181408
+BOOT_KNOT_COUNT = 6
+#what the background warm-up imports, roughly in the order the manager needs them
+WARM_UP_MODULES = ("numpy", "numpy.random", "disco_tie.output", "disco_tie.palette", "disco_tie.effects",
+                   "disco_tie.manager")
+
+_begun = weakref.WeakSet()
+
+
+def create_strip(led_count, led_pin=18, led_frequency=800_000, dma=10, channel=0):
+    from rpi_ws281x import Adafruit_NeoPixel
+    return Adafruit_NeoPixel(led_count, led_pin, led_frequency, dma, False,  255, channel)
+
+
+def begin_once(strip):
+    #the boot frame starts the strip before the LightStrip that takes it over exists
+    if strip not in _begun:
+        strip.begin()
+        _begun.add(strip)
+
+
+def boot_frame(led_count, knot_count=BOOT_KNOT_COUNT, color=BOOT_COLOR):
+    return [color] * min(knot_count, led_count) + [0] * max(led_count - knot_count, 0)
+
+
+def show_boot_frame(strip, frame):
+    begin_once(strip)
+    for i, word in enumerate(frame):
+        strip.setPixelColor(i, word)
+    strip.show()
+
+
+class StartupTimer:
+    #time since start (ideally the top of the entry script) for each named step of starting up
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.monotonic()
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = time.monotonic() - self.start
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.marks.items())
+
+
+class WarmUp(threading.Thread):
+    #imports the render stack and builds its lookup tables in the background, after the boot frame is up
+    def __init__(self, modules=WARM_UP_MODULES, gamma=2.2):
+        super().__init__(daemon=True)
+        self.modules = modules
+        self.gamma = gamma
+        self.error = None
+        self.elapsed = None
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            for module in self.modules:
+                importlib.import_module(module)
+            from disco_tie.output import gamma_table
+            gamma_table(self.gamma)
+        except Exception as e:
+            #whatever failed will fail again, with a proper traceback, when the manager imports it
+            self.error = e
+        self.elapsed = time.monotonic() - start
+        logger.info("warm up took %.0f ms", self.elapsed * 1000)
+
+    def wait(self):
+        self.join()
+        if self.error is not None:
+            logger.warning("warm up failed: %s", self.error)
@@ -0,0 +1,57 @@
+import numpy as np
+
+BLEND_MODES = ("over", "add", "multiply", "screen", "max")
+
+
+def blend(base, top, alpha, mode, scratch, out):
+    #blends top onto base with the given mode, weighted per pixel by alpha (n, 1). out may be base
+    if mode == "over":
+        np.subtract(top, base, out=scratch)
+    elif mode == "add":
+        np.multiply(top, alpha, out=scratch)
+        np.add(base, scratch, out=out)
+        np.minimum(out, 1.0, out=out)
+        return out
+    elif mode == "multiply":
+        np.multiply(base, top, out=scratch)
+        scratch -= base
+    elif mode == "screen":
+        #1 - (1 - base) * (1 - top), less base
+        np.subtract(1.0, base, out=scratch)
+        np.multiply(scratch, top, out=scratch)
+    elif mode == "max":
+        np.maximum(base, top, out=scratch)
+        scratch -= base
+    else:
+        raise ValueError(f"Unknown blend mode {mode}, should be one of {BLEND_MODES}")
+    scratch *= alpha
+    np.add(base, scratch, out=out)
+    return out
+
+
+class Compositor:
+    #folds a whole layer stack into one output layer in a single pass. hidden layers, layers at zero
+    #opacity and layers with no visible pixels are skipped without touching their pixels
+    def __init__(self, led_count):
+        self._scratch = np.empty((led_count, 3), dtype=np.float32)
+        self._alpha = np.empty((led_count, 1), dtype=np.float32)
+        self.composites = 0
+
+    def composite(self, layers, out, start=None, end=None):
+        span = slice(start, end)
+        result = out.pixels[span, :3]
+        bottom = layers[0]
+        if bottom.visible and bottom.opacity > 0:
+            np.multiply(bottom.pixels[span, :3], bottom.opacity, out=result)
+        else:
+            result.fill(0.0)
+        out.pixels[span, 3] = bottom.pixels[span, 3]
+        count = len(result)
+        for layer in layers[1:]:
+            if not layer.visible or layer.opacity <= 0 or layer.transparent:
+                continue
+            alpha = self._alpha[:count]
+            np.multiply(layer.pixels[span, 3:], layer.opacity, out=alpha)
+            blend(result, layer.pixels[span, :3], alpha, layer.blend_mode, self._scratch[:count], result)
+        self.composites += 1
+        return out
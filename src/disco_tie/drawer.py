@@ -1,43 +1,109 @@
-from rpi_ws281x import *
+import logging
+import time
+
+import numpy as np
+
+from disco_tie.boot import begin_once, create_strip
+from disco_tie.compositor import BLEND_MODES, Compositor, blend
+from disco_tie.metrics import RateLimitedLogger
+from disco_tie.output import PixelOutput
+from disco_tie.power import MAX_CURRENT, PowerLimiter
+
+log = RateLimitedLogger(logging.getLogger(__name__))
+
 
-MAX_CURRENT = 800
-SUBPIXEL_CURRENT = 15
 class LightStrip:
     def __init__(self,
                  led_count=70,
                  led_pin=18,
                  led_frequency=800_000,
                  overall_brightness = 0.1,
+                 strip=None,
+                 power_budget=MAX_CURRENT,
+                 gamma=2.2,
+                 dither=False,
+                 strict=False,
                  ):
         self.led_count = led_count
-        self.overall_brightness = overall_brightness
+        self._overall_brightness = overall_brightness
+        self.redraw = True
+        self.skipped_shows = 0
+        self.shows = 0
+        #how long the last strip.show() took
+        self.show_time = 0.0
+        self.strict = strict
         self.layers = [Layer(led_count)]
-        self.strip = Adafruit_NeoPixel(led_count, led_pin, led_frequency, 10, False,  255)
-        self.strip.begin()
+        self.layers[0].strict = strict
+        self.result_layer = Layer(led_count)
+        self.compositor = Compositor(led_count)
+        self.power = PowerLimiter(led_count, budget=power_budget)
+        if strip is None:
+            strip = create_strip(led_count, led_pin, led_frequency)
+        self.strip = strip
+        begin_once(self.strip)
+        #what the strip was set up with, the quality governor can only turn output.dither off from here
+        self.dither = dither
+        self.output = PixelOutput(self.strip, led_count, gamma=gamma, dither=dither)
+
+    @property
+    def overall_brightness(self):
+        return self._overall_brightness
 
-    def add_layer(self, alpha=0.0):
-        self.layers.append(Layer(self.led_count, alpha=alpha))
+    @overall_brightness.setter
+    def overall_brightness(self, brightness):
+        if brightness != self._overall_brightness:
+            self._overall_brightness = brightness
+            self.redraw = True
+
+    def reset(self):
+        #drops the power limiter's easing and the output's dither error, see Manager.reset
+        self.power.reset()
+        self.output.reset()
+        self.redraw = True
+
+    def add_layer(self, alpha=0.0, blend_mode="over", opacity=1.0):
+        self.layers.append(Layer(self.led_count, alpha=alpha, blend_mode=blend_mode, opacity=opacity))
+        self.layers[-1].strict = self.strict
 
         return self.layers[-1]
 
-    def draw(self):
-        #ensure we don't exceed the max current
-        result_layer = self.layers[0]
-        for layer in self.layers[1:]:
-            result_layer = result_layer + layer
-        total_brightness = result_layer.sum_brightness() * self.overall_brightness
-        total_current = SUBPIXEL_CURRENT * total_brightness
-        if total_current < MAX_CURRENT:
-            brightness_mult = 1.0
-        else:
-            brightness_mult = MAX_CURRENT / total_current
+    def _dirty_span(self):
+        start = end = None
+        for layer in self.layers:
+            if layer.dirty_start is None:
+                continue
+            start = layer.dirty_start if start is None else min(start, layer.dirty_start)
+            end = layer.dirty_end if end is None else max(end, layer.dirty_end)
+            layer.mark_clean()
+        return start, end
+
+    def draw(self, now=None):
+        #now is the frame clock the power limiter eases on, so a replay limits exactly like the recording
+        start, end = self._dirty_span()
+        if start is None and not (self.redraw or self.power.settling or self.output.dither):
+            #nothing has changed since the last frame. dithering is opt in because it needs a fresh pass every frame
+            return
+        self.redraw = False
 
-        #set all pixels
-        for i, pixel in enumerate(result_layer):
-            final_pixel = tuple(int(subpixel * brightness_mult * self.overall_brightness * 255) for subpixel in pixel[:3])
-            self.strip.setPixelColor(i, Color(final_pixel[0], final_pixel[1], final_pixel[2]))
+        #fold the changed span of the whole stack into the preallocated result layer in one pass
+        result_layer = self.result_layer
+        if start is not None:
+            self.compositor.composite(self.layers, result_layer, start, end)
 
+        #ensure we don't exceed the max current, measured on the gamma corrected light output
+        linear = self.output.linearize(result_layer.pixels[:, :3])
+        brightness_mult = self.power.update(linear, self.overall_brightness, now)
+
+        #set all pixels, skipping the show entirely if the output hasn't changed
+        self.output.pack(linear, brightness_mult * self.overall_brightness)
+        if not self.output.changed():
+            self.skipped_shows += 1
+            return
+        self.output.upload()
+        start = time.perf_counter()
         self.strip.show()
+        self.show_time = time.perf_counter() - start
+        self.shows += 1
 
     def set_pixel_color(self, pixel_id, color, layer=0):
         self.layers[layer].set_pixel_color(pixel_id, color)
@@ -45,65 +111,223 @@ class LightStrip:
     def fill(self, color, layer=0):
         self.layers[layer].fill(color)
 
+    def set_range(self, start, colors, layer=0):
+        self.layers[layer].set_range(start, colors)
+
+    def set_many(self, pixel_ids, colors, layer=0):
+        self.layers[layer].set_many(pixel_ids, colors)
+
+    def fill_gradient(self, start_color, end_color, start=None, end=None, layer=0):
+        self.layers[layer].fill_gradient(start_color, end_color, start, end)
+
     def clear(self):
         for i, layer in enumerate(self.layers):
-            print(f"clearing layer {i}")
+            log.debug("clearing layer %d", i)
             layer.clear()
         self.draw()
 
 
 class Layer:
-    def __init__(self, num_pixels, alpha = 1.0, preserve=False):
+    #strict layers raise ValueError on out of range colors instead of clamping them, for debugging effects
+    strict = False
+
+    def __init__(self, num_pixels, alpha = 1.0, preserve=False, blend_mode="over", opacity=1.0):
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode {blend_mode}, should be one of {BLEND_MODES}")
         self.preserve = preserve
-        self.pixels = [(0.0, 0.0, 0.0, alpha) for i in range(num_pixels)]
+        #one row per pixel: r, g, b, alpha
+        self.pixels = np.zeros((num_pixels, 4), dtype=np.float32)
+        self.pixels[:, 3] = alpha
+        self._scratch = np.empty((num_pixels, 3), dtype=np.float32)
+        self._alpha_scratch = np.empty((num_pixels, 1), dtype=np.float32)
         self.cleared = False
+        self._blend_mode = blend_mode
+        self._opacity = opacity
+        self._visible = True
+        self._alpha_changed = True
+        self._transparent = alpha == 0
+        #range of pixels changed since the last draw, as start/end indices
+        self.dirty_start = 0
+        self.dirty_end = num_pixels
 
-    def set_pixel_color(self, pixel_id, color):
+    @property
+    def dirty(self):
+        return self.dirty_start is not None
+
+    @property
+    def blend_mode(self):
+        return self._blend_mode
+
+    @blend_mode.setter
+    def blend_mode(self, blend_mode):
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode {blend_mode}, should be one of {BLEND_MODES}")
+        if blend_mode != self._blend_mode:
+            self._blend_mode = blend_mode
+            self.mark_dirty()
+
+    @property
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, opacity):
+        if opacity != self._opacity:
+            self._opacity = opacity
+            self.mark_dirty()
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible):
+        if visible != self._visible:
+            self._visible = visible
+            self.mark_dirty()
+
+    @property
+    def transparent(self):
+        #only rescans the alpha channel after it has been written to
+        if self._alpha_changed:
+            self._transparent = not self.pixels[:, 3].any()
+            self._alpha_changed = False
+        return self._transparent
+
+    def mark_dirty(self, start=None, end=None, step=None):
+        start, end, _ = slice(start, end, step).indices(len(self.pixels))
+        if end <= start:
+            return
+        if self.dirty_start is None:
+            self.dirty_start, self.dirty_end = start, end
+        else:
+            self.dirty_start = min(self.dirty_start, start)
+            self.dirty_end = max(self.dirty_end, end)
+
+    def mark_clean(self):
+        self.dirty_start = self.dirty_end = None
+
+    def _mark_pixel_dirty(self, pixel_id):
+        if pixel_id < 0:
+            pixel_id += len(self.pixels)
+        self.mark_dirty(pixel_id, pixel_id + 1)
+
+    def _check_cleared(self):
         if self.cleared:
-            print("WARNING: already cleared")
+            log.warning("drawing on a layer that was already cleared")
             self.cleared = False
-        if len(color) < 4:
-            alpha = self.pixels[pixel_id][3]
-            color = (color[0], color[1], color[2], alpha)
 
-        for channel in color:
-            if channel < 0 or channel > 1.0:
-                raise ValueError(f"Values out of range for color {color}. all channels should be floats between 0.0 and 1.0")
+    def _check_color(self, color):
+        #strict layers raise on out of range channels, otherwise they're clamped so a bad value can't stop the show
+        self._check_cleared()
+        if min(color) >= 0.0 and max(color) <= 1.0:
+            return color
+        if self.strict:
+            raise ValueError(f"Values out of range for color {color}. all channels should be floats between 0.0 and 1.0")
+        return tuple(min(max(channel, 0.0), 1.0) for channel in color)
+
+    def _check_colors(self, colors):
+        #the array version of _check_color, checks the whole array at once and only copies it if it needs clamping
+        self._check_cleared()
+        colors = np.asarray(colors, dtype=np.float32)
+        if colors.size and (colors.min() < 0.0 or colors.max() > 1.0):
+            if self.strict:
+                raise ValueError("Values out of range in colors, all channels should be floats between 0.0 and 1.0")
+            colors = np.clip(colors, 0.0, 1.0)
+        return colors
 
-        self.pixels[pixel_id] = color
+    def set_pixel_color(self, pixel_id, color):
+        color = self._check_color(color)
+        #colors without an alpha channel keep the pixel's current alpha
+        self.pixels[pixel_id, :len(color)] = color
+        self._alpha_changed |= len(color) > 3
+        self._mark_pixel_dirty(pixel_id)
 
     def fill(self, color, start=None, end=None, step=None):
-        for i, _ in enumerate(self.pixels[start:end:step]):
-            self.set_pixel_color(i, color)
+        color = self._check_color(color)
+        self.pixels[start:end:step, :len(color)] = color
+        self._alpha_changed |= len(color) > 3
+        self.mark_dirty(start, end, step)
+
+    def set_range(self, start, colors):
+        #copies an (n, 3) or (n, 4) array of colors onto the n pixels from start
+        colors = self._check_colors(colors)
+        end = start + len(colors)
+        self.pixels[start:end, :colors.shape[1]] = colors
+        self._alpha_changed |= colors.shape[1] > 3
+        self.mark_dirty(start, end)
+
+    def set_many(self, pixel_ids, colors):
+        #sets the pixels at an array of indices, to an array of colors or one color for all of them
+        pixel_ids = np.asarray(pixel_ids, dtype=np.intp)
+        if not len(pixel_ids):
+            return
+        colors = self._check_colors(colors)
+        channels = colors.shape[-1]
+        self.pixels[pixel_ids, :channels] = colors
+        self._alpha_changed |= channels > 3
+        pixel_ids = pixel_ids % len(self.pixels)
+        self.mark_dirty(int(pixel_ids.min()), int(pixel_ids.max()) + 1)
+
+    def fill_gradient(self, start_color, end_color, start=None, end=None):
+        #a linear blend from start_color on the first pixel of the span to end_color on the last
+        start_color = self._check_color(start_color)
+        end_color = self._check_color(end_color)
+        if len(start_color) != len(end_color):
+            raise ValueError(f"Both gradient colors should have the same number of channels ({start_color} vs {end_color})")
+        span = self.pixels[start:end, :len(start_color)]
+        if not len(span):
+            return
+        start_color = np.array(start_color, dtype=np.float32)
+        np.multiply(np.linspace(0.0, 1.0, len(span), dtype=np.float32)[:, None],
+                    np.subtract(end_color, start_color, dtype=np.float32), out=span)
+        span += start_color
+        self._alpha_changed |= len(start_color) > 3
+        self.mark_dirty(start, end)
 
     def fill_alpha(self, alpha, start=None, end=None, step=None):
-        for i, _ in enumerate(self.pixels[start:end:step]):
-            self.set_pixel_alpha(i, alpha)
+        self.pixels[start:end:step, 3] = alpha
+        self._alpha_changed = True
+        self.mark_dirty(start, end, step)
 
     def clear(self):
         self.fill((0.0, 0.0, 0.0))
         self.cleared = True
-        print("layer cleared")
+        log.debug("layer cleared")
 
     def set_pixel_alpha(self, pixel_id, alpha):
-        color = self.pixels[pixel_id][:3] + (alpha,)
-        self.pixels[pixel_id] = color
+        self.pixels[pixel_id, 3] = alpha
+        self._alpha_changed = True
+        self._mark_pixel_dirty(pixel_id)
+
+    def composite(self, other, out=None, start=None, end=None):
+        #blends other onto self with other's blend mode and opacity, written into out (which may be self).
+        #start/end limit it to a span
+        if out is None:
+            out = Layer(len(self))
+        span = slice(start, end)
+        base = self.pixels[span]
+        alpha = out._alpha_scratch[span]
+        np.multiply(other.pixels[span, 3:], other.opacity, out=alpha)
+        blend(base[:, :3], other.pixels[span, :3], alpha, other.blend_mode, out._scratch[span], out.pixels[span, :3])
+        if out is not self:
+            out.pixels[span, 3] = base[:, 3]
+        return out
 
     def __add__(self, other):
         if not isinstance(other, Layer):
             raise TypeError(f"Can only add Layers to other Layers, (not {type(other)})")
         if len(self.pixels) != len(other.pixels):
             raise KeyError(f"Both Layers should have the same size, ({len(self.pixels)} vs {len(other.pixels)})")
-        result = Layer(len(self.pixels))
-        for i, color in enumerate(self.pixels):
-            other_color = other.pixels[i]
-            this_component = tuple(ch * (1 - other_color[3]) for ch in color[:3])
-            other_component = tuple(ch * other_color[3] for ch in other_color[:3])
-            result.pixels[i] = tuple(ch + other_component[j] for j, ch in enumerate(this_component)) + (color[3],)
-        return result
+        return self.composite(other)
 
     def __getitem__(self, index):
-        return self.pixels[index]
+        if isinstance(index, slice):
+            return [tuple(color.tolist()) for color in self.pixels[index]]
+        return tuple(self.pixels[index].tolist())
+
+    def __len__(self):
+        return len(self.pixels)
 
     def sum_brightness(self):
-        return sum([sum(color[:3]) for color in self.pixels])
+        return float(self.pixels[:, :3].sum())
@@ -0,0 +1,354 @@
+import math
+
+import numpy as np
+
+from disco_tie.geometry import TieGeometry
+from disco_tie.noise import PerlinNoise
+from disco_tie.palette import PALETTES
+
+EFFECTS = []
+
+
+def register_effect(cls):
+    EFFECTS.append(cls)
+    return cls
+
+
+class Effect:
+    #renders a whole frame of rgb into an (led_count, 3) float array in one call.
+    #effects can work in led index space (self.index) or physical space (self.geometry)
+    name = None
+    color = (1.0, 1.0, 1.0)
+    #lowered by the quality governor when frames overrun, effects can trade detail for speed with it
+    quality = 1.0
+
+    def __init__(self, led_count, geometry=None):
+        self.led_count = led_count
+        self.geometry = geometry if geometry is not None else TieGeometry(led_count)
+        self.index = np.arange(led_count, dtype=np.float32)
+        self._values = np.zeros(led_count, dtype=np.float32)
+
+    def render(self, pixels, audio, dt):
+        raise NotImplementedError
+
+    def reseed(self, seed):
+        #effects that use random numbers restart their generator from seed
+        pass
+
+    def reset(self):
+        #effects that animate go back to where they were when built, so a recording can start mid show
+        pass
+
+
+@register_effect
+class Rainbow(Effect):
+    name = "rainbow"
+    color = (1.0, 1.0, 1.0)
+
+    def __init__(self, led_count, geometry=None):
+        super().__init__(led_count, geometry)
+        self.offset = 0.0
+        #wheel turns per second
+        self.speed = 0.3
+        self.width = led_count
+        self.palette = PALETTES["wheel"]
+
+    def render(self, pixels, audio, dt):
+        np.divide(self.index, self.width, out=self._values)
+        self._values += self.offset
+        #nearest entry lookups are cheaper and the lut is fine enough that it barely shows
+        self.palette.sample(self._values, pixels, interpolate=self.quality >= 1.0)
+        self.offset += self.speed * dt
+
+    def reset(self):
+        self.offset = 0.0
+
+
+@register_effect
+class VUMeter(Effect):
+    name = "vu meter"
+    color = (0.0, 1.0, 0.0)
+
+    def __init__(self, led_count, gain=4.0, peak_fall=0.5, geometry=None):
+        super().__init__(led_count, geometry)
+        self.gain = gain
+        self.peak_fall = peak_fall
+        self.peak = 0.0
+        #green at the bottom through yellow to red at the top
+        self._gradient = np.empty((led_count, 3), dtype=np.float32)
+        PALETTES["vu"].sample(self.index / max(led_count - 1, 1), self._gradient, interpolate=False)
+        self._lit = np.zeros(led_count, dtype=bool)
+
+    def reset(self):
+        self.peak = 0.0
+
+    def render(self, pixels, audio, dt):
+        level = min(audio.envelope * self.gain, 1.0) * self.led_count
+        self.peak = max(level, self.peak - self.peak_fall * self.led_count * dt)
+        np.less(self.index, level, out=self._lit)
+        np.multiply(self._gradient, self._lit[:, None], out=pixels)
+        peak_pixel = min(int(self.peak), self.led_count - 1)
+        if peak_pixel > 0:
+            pixels[peak_pixel] = (1.0, 1.0, 1.0)
+
+
+@register_effect
+class Spectrum(Effect):
+    name = "spectrum"
+    color = (0.0, 0.0, 1.0)
+
+    def __init__(self, led_count, geometry=None):
+        super().__init__(led_count, geometry)
+        #a fixed hue per LED running from red (bass) through green and blue to violet (treble)
+        self._hues = np.empty((led_count, 3), dtype=np.float32)
+        PALETTES["hsv"].sample(self.index / max(led_count - 1, 1) * 0.75, self._hues)
+
+    def render(self, pixels, audio, dt):
+        audio.led_levels(self._values)
+        np.multiply(self._hues, self._values[:, None], out=pixels)
+
+
+@register_effect
+class BeatStrobe(Effect):
+    name = "beat strobe"
+    color = (1.0, 0.0, 1.0)
+
+    def __init__(self, led_count, decay=8.0, geometry=None):
+        super().__init__(led_count, geometry)
+        self.decay = decay
+        self.flash = 0.0
+        self._color = np.empty((1, 3), dtype=np.float32)
+        self._hue = np.zeros(1, dtype=np.float32)
+        PALETTES["wheel"].sample(self._hue, self._color)
+
+    def reset(self):
+        self.flash = 0.0
+        self._hue[0] = 0.0
+        PALETTES["wheel"].sample(self._hue, self._color)
+
+    def render(self, pixels, audio, dt):
+        if audio.beat:
+            self.flash = 1.0
+            self._hue[0] = (self._hue[0] + 0.15) % 1.0
+            PALETTES["wheel"].sample(self._hue, self._color)
+        else:
+            self.flash *= math.exp(-self.decay * dt)
+        np.multiply(self._color, self.flash, out=pixels[:1])
+        pixels[1:] = pixels[0]
+
+
+@register_effect
+class Comet(Effect):
+    name = "comet"
+    color = (0.0, 1.0, 1.0)
+
+    def __init__(self, led_count, speed=20.0, tail=8.0, comet_color=(0.2, 0.6, 1.0), geometry=None):
+        super().__init__(led_count, geometry)
+        self.speed = speed
+        self.tail = tail
+        self.head = 0.0
+        self.comet_color = np.array(comet_color, dtype=np.float32)
+
+    def reset(self):
+        self.head = 0.0
+
+    def render(self, pixels, audio, dt):
+        #the music pushes the comet along faster
+        self.head = (self.head + self.speed * (1 + audio.envelope * 4) * dt) % self.led_count
+        np.subtract(self.head, self.index, out=self._values)
+        np.mod(self._values, self.led_count, out=self._values)
+        self._values *= -1 / self.tail
+        np.exp(self._values, out=self._values)
+        np.multiply(self.comet_color, self._values[:, None], out=pixels)
+
+
+@register_effect
+class Fire(Effect):
+    name = "fire"
+    color = (1.0, 0.3, 0.0)
+
+    def __init__(self, led_count, cooling=1.5, sparking=15.0, rise=30.0, seed=None, geometry=None):
+        super().__init__(led_count, geometry)
+        self.cooling = cooling
+        #sparks per second, and how many LEDs per second the heat climbs
+        self.sparking = sparking
+        self.rise = rise
+        self._rng = np.random.default_rng(seed)
+        self._random = np.empty(led_count, dtype=np.float32)
+        self.heat = np.zeros(led_count, dtype=np.float32)
+        self._spread = np.empty(led_count, dtype=np.float32)
+        self._cooling_scale = (self.index / led_count + 0.5).astype(np.float32)
+        self._sparks = max(led_count // 12, 1)
+        self._rising = 0.0
+
+    def reseed(self, seed):
+        self._rng = np.random.default_rng(seed)
+
+    def reset(self):
+        self.heat.fill(0.0)
+        self._rising = 0.0
+
+    def render(self, pixels, audio, dt):
+        #cool everything down a little, faster further from the base
+        self._rng.random(dtype=np.float32, out=self._random)
+        self._random *= self._cooling_scale
+        self._random *= self.cooling * dt
+        self.heat -= self._random
+        np.maximum(self.heat, 0, out=self.heat)
+
+        #heat rises a whole LED at a time, as many steps as this frame's share of the rise rate
+        self._rising += self.rise * dt
+        steps = min(int(self._rising), self.led_count)
+        self._rising -= int(self._rising)
+        for _ in range(steps):
+            self._spread[2:] = self.heat[1:-1]
+            self._spread[2:] += self.heat[:-2]
+            self._spread[2:] += self.heat[:-2]
+            self._spread[2:] /= 3
+            self.heat[2:] = self._spread[2:]
+
+        #new sparks near the base, at least one on a beat
+        sparks = self._rng.poisson(self.sparking * dt)
+        if audio.beat:
+            sparks = max(sparks, 1)
+        for _ in range(sparks):
+            position = self._rng.integers(0, self._sparks)
+            self.heat[position] = min(self.heat[position] + 0.5 + audio.envelope, 1.0)
+
+        PALETTES["fire"].sample(self.heat, pixels, interpolate=False)
+
+
+@register_effect
+class RadialPulse(Effect):
+    name = "radial pulse"
+    color = (1.0, 0.5, 0.0)
+
+    def __init__(self, led_count, speed=0.8, width=0.08, geometry=None):
+        super().__init__(led_count, geometry)
+        self.speed = speed
+        self.width = width
+        self.pulse = 2.0
+        self.hue = np.zeros(1, dtype=np.float32)
+        self._color = np.empty((1, 3), dtype=np.float32)
+        PALETTES["wheel"].sample(self.hue, self._color)
+
+    def reset(self):
+        self.pulse = 2.0
+        self.hue[0] = 0.0
+        PALETTES["wheel"].sample(self.hue, self._color)
+
+    def render(self, pixels, audio, dt):
+        #a ring of light spreads out from the knot on every beat
+        if audio.beat:
+            self.pulse = 0.0
+            self.hue[0] = (self.hue[0] + 0.1) % 1.0
+            PALETTES["wheel"].sample(self.hue, self._color)
+        self.pulse += self.speed * dt
+        np.subtract(self.geometry.nradius, self.pulse, out=self._values)
+        self._values /= self.width
+        np.square(self._values, out=self._values)
+        self._values *= -1
+        np.exp(self._values, out=self._values)
+        np.multiply(self._color, self._values[:, None], out=pixels)
+
+
+@register_effect
+class VerticalSweep(Effect):
+    name = "vertical sweep"
+    color = (0.5, 0.0, 1.0)
+
+    def __init__(self, led_count, period=1.5, width=0.15, geometry=None):
+        super().__init__(led_count, geometry)
+        self.period = period
+        self.width = width
+        self.position = 0.0
+        self.palette = PALETTES["hsv"]
+        self._colors = np.empty((led_count, 3), dtype=np.float32)
+        self.palette.sample(self.geometry.ny, self._colors)
+
+    def reset(self):
+        self.position = 0.0
+
+    def render(self, pixels, audio, dt):
+        #a bar of colour sweeping down the blade, wider when it's loud
+        self.position = (self.position + dt / self.period) % 1.0
+        width = self.width * (1 + audio.envelope * 4)
+        np.subtract(self.geometry.ny, self.position, out=self._values)
+        np.abs(self._values, out=self._values)
+        self._values /= -width
+        self._values += 1
+        np.clip(self._values, 0, 1, out=self._values)
+        np.multiply(self._colors, self._values[:, None], out=pixels)
+
+
+@register_effect
+class Plasma(Effect):
+    name = "plasma"
+    color = (0.0, 1.0, 0.5)
+
+    def __init__(self, led_count, speed=0.25, scale=2.5, octaves=3, gain=3.0, seed=None, geometry=None):
+        super().__init__(led_count, geometry)
+        self.speed = speed
+        self.scale = scale
+        self.octaves = octaves
+        #how much the music speeds the plasma up
+        self.gain = gain
+        self.time = 0.0
+        #the hue drift has its own wrap, time's wrap at 256 would jump it most of a turn
+        self.hue = 0.0
+        self.noise = PerlinNoise(seed)
+        self.palette = PALETTES["wheel"]
+        self._x = self.geometry.nx * scale
+        self._y = self.geometry.ny * scale
+
+    def reseed(self, seed):
+        self.noise.reseed(seed)
+
+    def reset(self):
+        self.time = 0.0
+        self.hue = 0.0
+
+    def render(self, pixels, audio, dt):
+        #a slowly churning 3d noise field, sliced through time. fewer octaves when the governor lowers quality
+        step = self.speed * (1 + audio.envelope * self.gain) * dt
+        self.time = (self.time + step) % 256
+        self.hue = (self.hue + step * 0.1) % 1.0
+        octaves = max(round(self.octaves * self.quality), 1)
+        self.noise.fbm(self._x, self._y, self.time, octaves=octaves, out=self._values)
+        self._values *= 0.75
+        self._values += self.hue
+        self.palette.sample(self._values, pixels, interpolate=self.quality >= 1.0)
+
+
+@register_effect
+class Shimmer(Effect):
+    name = "shimmer"
+    color = (0.6, 0.8, 1.0)
+
+    def __init__(self, led_count, speed=1.5, scale=0.35, octaves=2, shimmer_color=(0.6, 0.8, 1.0), seed=None,
+                 geometry=None):
+        super().__init__(led_count, geometry)
+        self.speed = speed
+        self.scale = scale
+        self.octaves = octaves
+        self.time = 0.0
+        self.noise = PerlinNoise(seed)
+        self.shimmer_color = np.array(shimmer_color, dtype=np.float32)
+        self._position = self.index * scale
+
+    def reseed(self, seed):
+        self.noise.reseed(seed)
+
+    def reset(self):
+        self.time = 0.0
+
+    def render(self, pixels, audio, dt):
+        #twinkling along the strip, louder music makes it brighter and sharper
+        self.time = (self.time + self.speed * dt) % 256
+        octaves = max(round(self.octaves * self.quality), 1)
+        self.noise.fbm(self._position, self.time, octaves=octaves, out=self._values)
+        self._values *= 1 + audio.envelope * 4
+        self._values += 0.3 + audio.envelope
+        np.clip(self._values, 0, 1, out=self._values)
+        np.square(self._values, out=self._values)
+        np.multiply(self.shimmer_color, self._values[:, None], out=pixels)
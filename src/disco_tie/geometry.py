@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+
+#centimetres between LEDs on a 60 per metre strip
+LED_SPACING = 1.67
+
+
+class TieGeometry:
+    #where every LED physically sits on the tie. the first knot_count LEDs form a ring for the knot,
+    #the rest run down the blade, snaking back and forth if there's more than one column.
+    #all the coordinate arrays are built once so effects can sample 2d fields across the whole strip
+    def __init__(self, led_count, knot_count=6, indicator_count=4, blade_columns=1, spacing=LED_SPACING,
+                 column_spacing=None):
+        self.led_count = led_count
+        self.knot_count = min(knot_count, led_count)
+        self.spacing = spacing
+        self.index = np.arange(led_count, dtype=np.float32)
+        #position along the strip, 0.0 to 1.0
+        self.u = self.index / max(led_count - 1, 1)
+
+        self.x = np.zeros(led_count, dtype=np.float32)
+        self.y = np.zeros(led_count, dtype=np.float32)
+        knot_radius = self.knot_count * spacing / (2 * math.pi)
+        angles = np.arange(self.knot_count) / max(self.knot_count, 1) * 2 * math.pi
+        self.x[:self.knot_count] = np.sin(angles) * knot_radius
+        self.y[:self.knot_count] = -np.cos(angles) * knot_radius
+
+        blade_count = led_count - self.knot_count
+        if blade_count > 0:
+            if column_spacing is None:
+                column_spacing = spacing
+            per_column = math.ceil(blade_count / blade_columns)
+            blade = np.arange(blade_count)
+            column = blade // per_column
+            row = blade % per_column
+            #every other column runs back up
+            row = np.where(column % 2, per_column - 1 - row, row)
+            self.x[self.knot_count:] = (column - (blade_columns - 1) / 2) * column_spacing
+            self.y[self.knot_count:] = knot_radius + spacing + row * spacing
+
+        self.radius = np.hypot(self.x, self.y).astype(np.float32)
+        self.angle = np.arctan2(self.x, -self.y).astype(np.float32)
+        #the same positions scaled into 0.0 to 1.0 so effects don't need to know the tie's size
+        self.nx = _normalise(self.x)
+        self.ny = _normalise(self.y)
+        self.nradius = _normalise(self.radius)
+
+        self.regions = {
+            "all": slice(0, led_count),
+            "knot": slice(0, self.knot_count),
+            "indicator": slice(0, min(indicator_count, self.knot_count)),
+            "blade": slice(self.knot_count, led_count),
+        }
+
+    def region(self, name):
+        return self.regions[name]
+
+    def mask(self, name):
+        mask = np.zeros(self.led_count, dtype=bool)
+        mask[self.regions[name]] = True
+        return mask
+
+
+def _normalise(values):
+    low = values.min() if len(values) else 0.0
+    span = values.max() - low if len(values) else 0.0
+    if span == 0:
+        return np.zeros_like(values, dtype=np.float32)
+    return ((values - low) / span).astype(np.float32)
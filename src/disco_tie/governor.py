@@ -0,0 +1,90 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+#best first. each step down gives up some optional work to win back frame time
+QUALITY_TIERS = (
+    {"name": "full", "dither": True, "band_count": 24, "effect_quality": 1.0, "framerate": 30},
+    {"name": "no dither", "dither": False, "band_count": 24, "effect_quality": 1.0, "framerate": 30},
+    {"name": "reduced", "dither": False, "band_count": 12, "effect_quality": 0.5, "framerate": 30},
+    {"name": "low", "dither": False, "band_count": 12, "effect_quality": 0.5, "framerate": 20},
+    {"name": "minimal", "dither": False, "band_count": 6, "effect_quality": 0.25, "framerate": 15},
+)
+
+
+class QualityGovernor:
+    #watches how much of each frame's budget is spent and steps the quality tier down when frames overrun,
+    #then back up once there's been headroom for a while
+    def __init__(self, manager, tiers=QUALITY_TIERS, high_water=0.9, low_water=0.6, smoothing=0.1,
+                 step_down_frames=15, step_up_frames=150):
+        self.manager = manager
+        self.tiers = tiers
+        self.high_water = high_water
+        self.low_water = low_water
+        self.smoothing = smoothing
+        self.step_down_frames = step_down_frames
+        self.step_up_frames = step_up_frames
+        self.enabled = True
+        self.tier = 0
+        self.load = 0.0
+        self.changes = 0
+        self._over = 0
+        self._under = 0
+
+    @property
+    def tier_name(self):
+        return self.tiers[self.tier]["name"]
+
+    def update(self, stats):
+        if not self.enabled or not stats.costs:
+            return
+        budget = 1 / self.tiers[self.tier]["framerate"]
+        self.load += (stats.costs[-1] / budget - self.load) * self.smoothing
+        if self.load > self.high_water:
+            self._over += 1
+            self._under = 0
+        elif self.load < self.low_water:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.step_down_frames and self.tier < len(self.tiers) - 1:
+            self.set_tier(self._step(1))
+        elif self._under >= self.step_up_frames and self.tier > 0:
+            self.set_tier(self._step(-1))
+
+    def _effective(self, tier):
+        #what a tier actually changes. tiers can only turn dithering off, not on
+        settings = dict(self.tiers[tier], name=None)
+        settings["dither"] = settings["dither"] and self.manager.drawer.dither
+        return settings
+
+    def _step(self, direction):
+        #steps over tiers that would change nothing, like no dither on a strip that isn't dithering
+        tier = self.tier + direction
+        if direction > 0:
+            while tier < len(self.tiers) - 1 and self._effective(tier) == self._effective(self.tier):
+                tier += 1
+        else:
+            while tier > 0 and self._effective(tier - 1) == self._effective(tier):
+                tier -= 1
+        return tier
+
+    def set_tier(self, tier):
+        previous = self.tiers[self.tier]
+        settings = self.tiers[tier]
+        self.tier = tier
+        self.changes += 1
+        self._over = self._under = 0
+        manager = self.manager
+        manager.drawer.output.dither = settings["dither"] and manager.drawer.dither
+        audio = manager.audio_features
+        if hasattr(audio, "set_band_count") and audio.band_count != settings["band_count"]:
+            audio.set_band_count(settings["band_count"])
+        for effect in manager.effects:
+            effect.quality = settings["effect_quality"]
+        manager.framerate = settings["framerate"]
+        #measured load is relative to the budget, which may just have changed
+        self.load *= previous["framerate"] / settings["framerate"]
+        logger.info("quality tier %s (load %.2f)", self.tier_name, self.load)
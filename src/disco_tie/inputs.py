@@ -0,0 +1,88 @@
+import time
+from collections import deque, namedtuple
+
+PRESS = "press"
+RELEASE = "release"
+LONG_PRESS = "long_press"
+REPEAT = "repeat"
+
+ButtonEvent = namedtuple("ButtonEvent", ["time", "button", "kind"])
+
+
+class _ButtonState:
+    def __init__(self, name, long_press_time, repeat):
+        self.name = name
+        self.long_press_time = long_press_time
+        self.repeat = repeat
+        self.raw = False
+        self.pressed = False
+        self.last_edge = -float("inf")
+        self.pressed_time = None
+        self.long_sent = False
+        self.next_repeat = None
+
+
+class InputManager:
+    #gpio callbacks only queue raw edges; drain() turns them into debounced events once per frame,
+    #so the main loop never reads a pin and taps shorter than a frame still register
+    def __init__(self, debounce=0.02, long_press_time=1.0, repeat_delay=0.5, repeat_interval=0.15):
+        self.debounce = debounce
+        self.long_press_time = long_press_time
+        self.repeat_delay = repeat_delay
+        self.repeat_interval = repeat_interval
+        self.buttons = {}
+        self._edges = deque()
+        self._events = []
+
+    def add_button(self, name, button, long_press_time=None, repeat=False):
+        if long_press_time is None:
+            long_press_time = self.long_press_time
+        self.buttons[name] = _ButtonState(name, long_press_time, repeat)
+        button.when_pressed = lambda: self._edges.append((time.monotonic(), name, True))
+        button.when_released = lambda: self._edges.append((time.monotonic(), name, False))
+
+    def push(self, event):
+        #inject an already debounced event, used when replaying a recording
+        self._events.append(event)
+
+    def drain(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        events = self._events
+        self._events = []
+        while self._edges:
+            edge_time, name, level = self._edges.popleft()
+            state = self.buttons[name]
+            state.raw = level
+            if level != state.pressed and edge_time - state.last_edge >= self.debounce:
+                self._change(state, level, edge_time, events)
+
+        for state in self.buttons.values():
+            #an edge swallowed by the debounce window still counts once the level has settled
+            if state.raw != state.pressed and now - state.last_edge >= self.debounce:
+                self._change(state, state.raw, state.last_edge + self.debounce, events)
+            if not state.pressed:
+                continue
+            if not state.long_sent and now - state.pressed_time >= state.long_press_time:
+                state.long_sent = True
+                events.append(ButtonEvent(now, state.name, LONG_PRESS))
+            if state.repeat and now >= state.next_repeat:
+                state.next_repeat += self.repeat_interval
+                if state.next_repeat < now:
+                    state.next_repeat = now + self.repeat_interval
+                events.append(ButtonEvent(now, state.name, REPEAT))
+        return events
+
+    def _change(self, state, level, edge_time, events):
+        state.pressed = level
+        state.last_edge = edge_time
+        if level:
+            state.pressed_time = edge_time
+            state.long_sent = False
+            state.next_repeat = edge_time + self.repeat_delay
+            events.append(ButtonEvent(edge_time, state.name, PRESS))
+        else:
+            events.append(ButtonEvent(edge_time, state.name, RELEASE))
+
+    def is_pressed(self, name):
+        return self.buttons[name].pressed
@@ -1,16 +1,24 @@
-from signal import pause
+import time
+STARTED = time.monotonic()
 
-from gpiozero import LED, Button
-from disco_tie import strandtest
-from disco_tie.manager import Manager
-from disco_tie.drawer import LightStrip
-from disco_tie.options import Option
+import logging
+import os
 
-BLINKER = LED(21)
-OPTIONS_BTN = Button(22)
-MINUS_BTN = Button(27)
-PLUS_BTN = Button(17)
-POWER_BTN = Button(3, hold_time=5)
+from disco_tie.boot import StartupTimer, WarmUp, boot_frame, create_strip, show_boot_frame
+
+LED_COUNT = 72
+#gpiozero and the render stack are imported after the boot frame is up, see make_buttons and Manager
+BLINKER = OPTIONS_BTN = MINUS_BTN = PLUS_BTN = POWER_BTN = None
+
+
+def make_buttons():
+    global BLINKER, OPTIONS_BTN, MINUS_BTN, PLUS_BTN, POWER_BTN
+    from gpiozero import LED, Button
+    BLINKER = LED(21)
+    OPTIONS_BTN = Button(22)
+    MINUS_BTN = Button(27)
+    PLUS_BTN = Button(17)
+    POWER_BTN = Button(3, hold_time=5)
 
 
 def clear_leds():
@@ -35,15 +43,38 @@ def options_pressed():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    startup = StartupTimer(STARTED)
+    #light the knot before anything slow happens, so the tie never sits dark after power on
+    strip = create_strip(LED_COUNT)
+    show_boot_frame(strip, boot_frame(LED_COUNT))
+    startup.mark("boot frame")
+    warm_up = WarmUp()
+    warm_up.start()
+    make_buttons()
+    startup.mark("buttons")
     if OPTIONS_BTN.is_pressed and POWER_BTN.is_pressed:
         print("safe mode")
+        show_boot_frame(strip, [0] * LED_COUNT)
     else:
-        manager = Manager(led_count=72,
+        from disco_tie.audio import AlsaSource
+        try:
+            audio_source = AlsaSource()
+        except Exception as e:
+            print(f"No audio input available: {e}")
+            audio_source = None
+        warm_up.wait()
+        startup.mark("warm up")
+        from disco_tie.manager import Manager
+        manager = Manager(led_count=LED_COUNT,
                           blinker=BLINKER,
                           options_btn=OPTIONS_BTN,
                           plus_btn=PLUS_BTN,
                           minus_btn=MINUS_BTN,
-                          power_btn=POWER_BTN,)
+                          power_btn=POWER_BTN,
+                          audio_source=audio_source,
+                          strip=strip,
+                          startup=startup,)
         manager.run()
         #strandtest.start_show(clear=True)
         #pause()
@@ -1,231 +1,371 @@
+import logging
+import threading
 import time
 import os
 from enum import Enum
-
-from disco_tie.drawer import LightStrip
+from functools import partial
+
+import numpy as np
+
+from disco_tie.analysis import AudioAnalyser
+from disco_tie.animation import Animator
+from disco_tie.boot import StartupTimer
+from disco_tie.audio import SAMPLE_RATE, AudioCapture
+from disco_tie.drawer import LightStrip, create_strip
+from disco_tie.effects import EFFECTS
+from disco_tie.geometry import TieGeometry
+from disco_tie.governor import QualityGovernor
+from disco_tie.inputs import LONG_PRESS, PRESS, REPEAT, InputManager
+from disco_tie.metrics import Metrics, RateLimitedLogger
+from disco_tie.multistrip import create_multi_strip
 from disco_tie.options import Option
+from disco_tie.palette import load_palettes
+from disco_tie.pipeline import Pipeline
+from disco_tie.recording import Recorder
+from disco_tie.scheduler import FrameScheduler
+from disco_tie.simulator import SimButton, SimLED
 STARTUP_TIME = time.time()
-
-MODE_COLORS = {0:(1,1,1)}
+log = RateLimitedLogger(logging.getLogger(__name__))
 
 
 class Manager:
     def __init__(self, led_count=74, blinker=None, options_btn=None, minus_btn=None, plus_btn=None, power_btn=None,
-                 run=False):
+                 run=False, strip=None, audio_source=None, pipelined=False, strip_factory=None, settings=None,
+                 led_pin=18, outputs=None, network=None, metrics_socket=None, metrics_dump=None,
+                 startup=None, dither=False):
         self.running = run
-        self.framerate = 30
+        #set while the main loop isn't running, so shutdown() can wait for it to finish tearing down
+        self._loop_done = threading.Event()
+        self._loop_done.set()
+        self._close_lock = threading.Lock()
+        self.closed = False
+        #a boot.StartupTimer from the entry script, so time to first frame includes the imports
+        self.startup = startup if startup is not None else StartupTimer()
+        #the time the current frame started, on the monotonic clock
+        self.now = time.monotonic()
+        self.recorder = None
+        self.scheduler = FrameScheduler(framerate=30)
         self.options_hold_time = 3
         self.min_brightness = 0.01
+        #outputs splits the LEDs over several data lines, see multistrip.create_multi_strip
+        if outputs is not None:
+            led_count = sum(output["led_count"] for output in outputs)
+            if strip is None and strip_factory is None:
+                strip_factory = partial(create_multi_strip, outputs)
         self.led_count = led_count
         self.speed = 1
         self.current_pixel = 0
         self.brightness_steps = 20
-        self.blinker = blinker
-        self.options_btn = options_btn
-        self.minus_btn = minus_btn
-        self.plus_btn = plus_btn
-        self.power_btn = power_btn
+        #anything not wired up gets a simulated stand-in so the manager can run headless
+        self.blinker = blinker if blinker is not None else SimLED()
+        self.options_btn = options_btn if options_btn is not None else SimButton()
+        self.minus_btn = minus_btn if minus_btn is not None else SimButton()
+        self.plus_btn = plus_btn if plus_btn is not None else SimButton()
+        self.power_btn = power_btn if power_btn is not None else SimButton(hold_time=5)
+        #pipelined mode hands audio analysis and strip output to their own processes
+        self.pipeline = None
+        self.audio_window = 1024
+        if pipelined:
+            if strip_factory is None:
+                strip_factory = partial(create_strip, led_count, led_pin)
+            self.pipeline = Pipeline(led_count, strip_factory, audio_source=audio_source,
+                                     window=self.audio_window, framerate=self.framerate)
+            strip = self.pipeline.strip
+        elif strip is None and strip_factory is not None:
+            strip = strip_factory()
         self.drawer = LightStrip(led_count=led_count,
-                                 led_pin=18,
+                                 led_pin=led_pin,
                                  led_frequency=800_000,
-                                 overall_brightness=1.0, )
-
-
-        self.opt_held = False
-        self.opt_pressed = False
-        self.opt_released = False
-        self.plus_held = False
-        self.plus_pressed = False
-        self.plus_released = False
-        self.minus_held = False
-        self.minus_pressed = False
-        self.minus_released = False
-        self.power_held = False
-        self.audio_sample = None
+                                 overall_brightness=1.0,
+                                 strip=strip,
+                                 dither=dither, )
+
+        self.inputs = InputManager()
+        self.inputs.add_button("options", self.options_btn, long_press_time=self.options_hold_time)
+        self.inputs.add_button("plus", self.plus_btn, repeat=True)
+        self.inputs.add_button("minus", self.minus_btn, repeat=True)
+        self.input_events = []
+        self.audio_sample = np.zeros(self.audio_window, dtype=np.float32)
+        self.audio = None
+        sample_rate = SAMPLE_RATE
+        if audio_source is not None and self.pipeline is None:
+            self.audio = AudioCapture(audio_source)
+            self.audio.start()
+            sample_rate = audio_source.sample_rate
+        #bands, rms, envelope, onset, beat and bpm for update() and the modes to read
+        if self.pipeline is not None and self.pipeline.audio_features is not None:
+            self.audio_features = self.pipeline.audio_features
+        else:
+            self.audio_features = AudioAnalyser(sample_rate=sample_rate,
+                                                window=self.audio_window,
+                                                led_count=led_count)
+        if self.pipeline is not None:
+            self.pipeline.start()
 
         self.deltatime = 1 / self.framerate
         self.blinker.blink()
         self.power_btn.when_held = self.shutdown
 
-        self.rainbow_offset = 0
-        self.rainbow_speed = 0.01
-        self.rainbow_width = self.led_count
+        #every mode is built once up front so switching never has to allocate
+        self.geometry = TieGeometry(led_count)
+        self.effects = [effect_class(led_count, geometry=self.geometry) for effect_class in EFFECTS]
+        self.mode = 0
+        #mode and brightness changes ease in over transition_time seconds.
+        #a mode change renders the outgoing and incoming modes into their own buffers and crossfades them
+        self.animator = Animator()
+        self.transition_time = 0.5
+        self.fade_from = None
+        self.fade_progress = 1.0
+        #true when fading out from a snapshot of the strip instead of a live mode
+        self._fade_frozen = False
+        self._fade_out = np.zeros((led_count, 3), dtype=np.float32)
+        self._fade_in = np.zeros((led_count, 3), dtype=np.float32)
+        #a network.NetworkInput, frames from it replace the local effects while the stream is live
+        self.network = network
+        if settings is not None:
+            Option.store = settings
+        self.settings = Option.get_store()
+        self.palettes = load_palettes(self.settings.data)
+        self.get_effect("rainbow").palette = self.palettes.get(self.settings.get("palette"), self.palettes["wheel"])
 
         self.options_active = False
-        self.options_activated = False
         self.options_setting = 0
-        self.options_last_press_time = None
-        self.options_activated_time = None
 
         self.main_strip = self.drawer.layers[0]
         self.knot = self.drawer.add_layer()
         self.options_layer = self.drawer.add_layer()
-        for i in range(6):
-            self.knot.set_pixel_alpha(i, 1.0)
+        self.options_layer.visible = False
+        knot = self.geometry.region("knot")
+        self.knot.fill_alpha(1.0, knot.start, knot.stop)
         self.set_knot_color((1.0, 1.0, 1.0))
         self.options = []
         self.add_option("brightness",
                         color=(1.0, 1.0, 1.0),
                         increase_func=self._set_brightness,
                         decrease_func=self._set_brightness,
-                        init_func=self._set_brightness,
+                        init_func=self._init_brightness,
                         maximum=self.brightness_steps,
                         wrap=False)
         self.add_option("mode",
                         color=(1.0, 1.0, 0.0),
                         increase_func=self._set_mode,
                         decrease_func=self._set_mode,
-                        init_func=self._set_mode,
-                        maximum=0,
+                        init_func=self._init_mode,
+                        maximum=len(self.effects) - 1,
                         wrap=True)
+        self.governor = QualityGovernor(self)
+        #stage timings and counters, readable over metrics_socket or dumped as json to metrics_dump
+        self.metrics = Metrics(self, dump_path=metrics_dump, socket_path=metrics_socket)
+        self.startup.mark("manager ready")
         if self.running:
-            self._main_loop()
+            self.run()
+
+    @property
+    def framerate(self):
+        return self.scheduler.framerate
+
+    @framerate.setter
+    def framerate(self, framerate):
+        self.scheduler.framerate = framerate
+
+    @property
+    def estimated_current(self):
+        return self.drawer.power.estimated_current
+
+    @property
+    def quality_tier(self):
+        return self.governor.tier_name
+
+    @property
+    def frame_stats(self):
+        return self.scheduler.stats
 
     def _main_loop(self):
-        frame_end = None
+        self.scheduler.start()
+        metrics = self.metrics
         while self.running:
-            if frame_end is None:
-                frame_start = time.time()
-            else:
-                frame_start = frame_end
-
+            self.now = self.scheduler.frame_start
+            metrics.begin_frame(self.now)
             self._get_inputs()
+            metrics.lap("inputs")
             self._get_audio()
+            metrics.lap("audio")
             self.update()
+            metrics.lap("update")
             self._draw()
-
-            frame_end = time.time()
-            self.deltatime = frame_end - frame_start
-            excess = 1 / self.framerate - self.deltatime
-            if excess > 0:
-                time.sleep(excess)
+            metrics.lap("draw")
+            if not metrics.frames:
+                self.startup.mark("first frame")
+                log.info("startup: %s", self.startup.summary())
+            if self.recorder is not None:
+                self.recorder.record(self)
+            metrics.lap("record")
+
+            self.deltatime = self.scheduler.wait()
+            self.governor.update(self.scheduler.stats)
+            metrics.end_frame(self.deltatime)
 
     def _get_inputs(self):
-        prev_opt = self.opt_held
-        self.opt_held = self.options_btn.is_pressed
-        if self.opt_held and not prev_opt:
-            self.opt_pressed = True
-        else:
-            self.opt_pressed = False
-        if not self.opt_held and prev_opt:
-            self.opt_released = True
-        else:
-            self.opt_released = False
-
-        self.power_held = self.power_btn.is_pressed
-
-        prev_plus = self.plus_held
-        self.plus_held = self.plus_btn.is_pressed
-        if self.plus_held and not prev_plus:
-            self.plus_pressed = True
-        else:
-            self.plus_pressed = False
-        if not self.plus_held and prev_plus:
-            self.plus_released = True
-        else:
-            self.plus_released = False
-
-        prev_minus = self.minus_held
-        self.minus_held = self.minus_btn.is_pressed
-        if self.minus_held and not prev_minus:
-            self.minus_pressed = True
-        else:
-            self.minus_pressed = False
-        if not self.minus_held and prev_minus:
-            self.minus_released = True
-        else:
-            self.minus_released = False
+        self.input_events = self.inputs.drain()
 
     def _get_audio(self):
-        self.audio_sample = [0]
+        if self.audio is not None:
+            self.audio_sample = self.audio.latest(self.audio_window)
+        self.audio_features.update(self.audio_sample, self.now)
 
     def _draw(self):
         if self.drawer is not None:
-            self.drawer.draw()
+            self.drawer.draw(self.now)
             return
-        self.print("drawing")
+        log.debug("drawing")
 
     def open_options(self):
-        print("opening options")
+        log.info("opening options")
         self.options_active = True
-        self.options_layer.fill_alpha(1.0, end=6)
+        knot = self.geometry.region("knot")
+        self.options_layer.fill_alpha(1.0, knot.start, knot.stop)
+        self.options_layer.visible = True
 
     def close_options(self):
-        print("closing options")
+        log.info("closing options")
         self.options_active = False
         self.options_layer.fill_alpha(0.0)
+        self.options_layer.visible = False
 
     def next_setting(self):
-        print("next option")
+        log.info("next option")
         self.options_setting += 1
         if self.options_setting >= len(self.options):
             self.options_setting = 0
 
     def increase_setting(self):
-        print("Increase")
+        log.info("increase")
         self.options[self.options_setting].increase()
 
     def decrease_setting(self):
-        print("Decrease")
+        log.info("decrease")
         self.options[self.options_setting].decrease()
 
-    def _set_brightness(self, integer):
-        self.drawer.overall_brightness = integer/ self.brightness_steps
-        if self.drawer.overall_brightness < self.min_brightness:
-            self.drawer.overall_brightness = self.min_brightness
-
-    def _set_mode(self, mode_num):
-        self.set_knot_color(MODE_COLORS[mode_num])
+    def _brightness_level(self, integer):
+        return max(integer / self.brightness_steps, self.min_brightness)
 
-    def update(self):
-        if int(time.time()) % 2:
-            opt_color = self.options[self.options_setting].color
-            self.options_layer.fill(opt_color, end=4)
-        else:
-            self.options_layer.fill((0.0, 0.0, 0.0), end=6)
+    def _init_brightness(self, integer):
+        self.drawer.overall_brightness = self._brightness_level(integer)
 
-        if self.opt_pressed:
-            self.options_last_press_time = time.time()
-            if self.options_active:
-                self.next_setting()
+    def _set_brightness(self, integer):
+        self.animator.tween(self.drawer, "overall_brightness", self._brightness_level(integer), self.transition_time)
 
-        if self.opt_released:
-            self.options_activated = False
+    def _init_mode(self, mode_num):
+        self.mode = mode_num
+        self.fade_from = None
+        self.set_knot_color(self.effects[mode_num].color)
 
-        if self.opt_held and not self.options_activated and time.time() > self.options_last_press_time + self.options_hold_time:
-            self.options_activated = True
-            if not self.options_active:
-                self.open_options()
+    def _set_mode(self, mode_num):
+        #crossfading renders two modes, so it's the first thing to go when the governor lowers quality
+        if mode_num != self.mode and self.effects[mode_num].quality >= 1.0:
+            if self.fade_from is not None:
+                #already mid fade, so fade out from what's on the strip now rather than jumping to the
+                #half faded in mode. holding plus or minus repeats faster than a whole fade
+                np.copyto(self._fade_out, self.main_strip.pixels[:, :3])
+                self._fade_frozen = True
             else:
-                self.close_options()
+                self._fade_frozen = False
+            self.fade_from = self.mode
+            self.fade_progress = 0.0
+            self.animator.tween(self, "fade_progress", 1.0, self.transition_time, on_complete=self._end_fade)
+        self.mode = mode_num
+        self.set_knot_color(self.effects[mode_num].color)
+
+    def _end_fade(self):
+        self.fade_from = None
+
+    def update(self):
+        self.animator.update(self.deltatime)
 
         if self.options_active:
-            if self.plus_pressed:
-                self.increase_setting()
-            if self.minus_pressed:
-                self.decrease_setting()
+            if int(self.now) % 2:
+                opt_color = self.options[self.options_setting].color
+                indicator = self.geometry.region("indicator")
+                self.options_layer.fill(opt_color, indicator.start, indicator.stop)
+            else:
+                knot = self.geometry.region("knot")
+                self.options_layer.fill((0.0, 0.0, 0.0), knot.start, knot.stop)
+
+        for event in self.input_events:
+            if event.button == "options":
+                if event.kind == PRESS and self.options_active:
+                    self.next_setting()
+                elif event.kind == LONG_PRESS:
+                    if not self.options_active:
+                        self.open_options()
+                    else:
+                        self.close_options()
+            elif self.options_active and event.kind in (PRESS, REPEAT):
+                if event.button == "plus":
+                    self.increase_setting()
+                elif event.button == "minus":
+                    self.decrease_setting()
+
+        pixels = self.main_strip.pixels[:, :3]
+        if self.network is not None and self.network.poll(pixels, self.now):
+            if self.network.updated:
+                self.main_strip.mark_dirty()
+            return
 
-        self.drawer.fill((0, 0, 0))
-        for i in range(self.led_count):
-            self.drawer.set_pixel_color(i, color_wheel(i / self.rainbow_width + self.rainbow_offset))
-        self.rainbow_offset += self.rainbow_speed
+        effect = self.effects[self.mode]
+        if self.fade_from is None:
+            effect.render(pixels, self.audio_features, self.deltatime)
+        else:
+            if not self._fade_frozen:
+                self.effects[self.fade_from].render(self._fade_out, self.audio_features, self.deltatime)
+            effect.render(self._fade_in, self.audio_features, self.deltatime)
+            np.subtract(self._fade_in, self._fade_out, out=pixels)
+            pixels *= self.fade_progress
+            pixels += self._fade_out
+        self.main_strip.mark_dirty()
 
     def clear_leds(self):
         self.blinker.off()
         if self.drawer is not None:
             self.drawer.clear()
             return
-        print("clearing")
+        log.debug("clearing")
 
     def run(self):
         self.running = True
-        self._main_loop()
+        self._loop_done.clear()
+        try:
+            self._main_loop()
+        finally:
+            self.close()
+            self._loop_done.set()
+
+    def close(self):
+        #tears everything down once, on whichever thread gets here first
+        with self._close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.running = False
+        self.clear_leds()
+        self.stop_recording()
+        if self.audio is not None:
+            self.audio.stop()
+        if self.network is not None:
+            self.network.close()
+        self.metrics.close()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.settings.close()
 
     def shutdown(self):
-        self.clear_leds()
+        #runs on the power button's thread. the main loop notices running go false and tears down on its own
+        #thread, this only steps in if there's no loop running
         self.running = False
+        self._loop_done.wait(timeout=5)
+        self.close()
         if time.time() > STARTUP_TIME + 10:
-            print("Restarting in 5 seconds")
+            log.warning("restarting in 5 seconds")
             time.sleep(5)
             os.system("sudo poweroff")
 
@@ -233,9 +373,56 @@ class Manager:
         option = Option(option_name,color, increase_func, decrease_func, init_func, maximum, wrap)
         self.options.append(option)
 
+    def reseed(self, seed):
+        for effect in self.effects:
+            effect.reseed(seed)
+
+    def reset(self, seed):
+        #puts everything that carries over between frames back to how a fresh manager starts, with the effects
+        #reseeded. a recording can then start mid show and still replay from just its header and records
+        self.animator.finish_all()
+        self.fade_from = None
+        self.fade_progress = 1.0
+        self._fade_frozen = False
+        if self.options_active:
+            self.close_options()
+        self.options_setting = 0
+        for effect in self.effects:
+            effect.reset()
+        self.reseed(seed)
+        self.drawer.reset()
+
+    def start_recording(self, path, seed=None):
+        if seed is None:
+            seed = int(time.time()) & 0xffffffff
+        self.stop_recording()
+        self.reset(seed)
+        #room for the most bands any tier uses, so stepping back up mid recording doesn't lose any
+        band_count = max([self.audio_features.band_count] + [tier["band_count"] for tier in self.governor.tiers])
+        self.recorder = Recorder(path, self.led_count, band_count, seed=seed,
+                                 brightness=self.get_option("brightness").value, mode=self.mode,
+                                 dither=self.drawer.dither)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def get_option(self, setting):
+        for option in self.options:
+            if option.setting == setting:
+                return option
+        raise KeyError(f"No option called {setting}")
+
+    def get_effect(self, name):
+        for effect in self.effects:
+            if effect.name == name:
+                return effect
+        raise KeyError(f"No effect called {name}")
+
     def set_knot_color(self, color):
-        for i in range(4):
-            self.knot.set_pixel_color(i, color)
+        indicator = self.geometry.region("indicator")
+        self.knot.fill(color, indicator.start, indicator.stop)
 
 def color_wheel(pos):
     pos = pos % 1.0
@@ -0,0 +1,250 @@
+import argparse
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import socket
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("inputs", "audio", "update", "draw", "record")
+#one row per frame: when it started, how long since the last one, each stage's cost, show() duration and current draw
+SAMPLE_DTYPE = np.dtype([("time", "f8"), ("interval", "f4")] + [(stage, "f4") for stage in STAGES]
+                        + [("show", "f4"), ("current", "f4")])
+
+
+class RateLimitedLogger:
+    #wraps a logger so a message from the hot path is written at most once per interval, with a count
+    #of the repeats that were dropped. messages are formatted lazily, so a disabled level is just one check
+    def __init__(self, logger, interval=1.0):
+        self.logger = logger
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last = self._last.get(msg)
+        if last is not None and now - last < self.interval:
+            self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+            return
+        self._last[msg] = now
+        suppressed = self._suppressed.pop(msg, 0)
+        if suppressed:
+            msg = f"{msg} ({suppressed} more suppressed)"
+        self.logger.log(level, msg, *args)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+
+class Metrics:
+    #per stage timings and counters for the manager's main loop, with the last `history` frames kept in a ring buffer.
+    #snapshots can be dumped to a json file every dump_interval seconds, or read from a unix socket (see MetricsServer)
+    def __init__(self, manager, history=300, dump_path=None, dump_interval=10.0, socket_path=None,
+                 profile_path=None):
+        self.manager = manager
+        self.samples = np.zeros(history, dtype=SAMPLE_DTYPE)
+        self.index = 0
+        self.frames = 0
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._next_dump = None
+        #set to turn the profiler on or off, it's started and stopped on the main loop's thread
+        self.profiling = False
+        self.profile_path = profile_path
+        self._profiler = None
+        self._sample = self.samples[0]
+        self._lap = 0.0
+        self._shows = 0
+        self.server = MetricsServer(self, socket_path) if socket_path is not None else None
+
+    def begin_frame(self, now):
+        self._sample = self.samples[self.index]
+        self._sample["time"] = now
+        self._lap = time.perf_counter()
+
+    def lap(self, stage):
+        #charges the time since the last lap to a stage
+        now = time.perf_counter()
+        self._sample[stage] = now - self._lap
+        self._lap = now
+
+    def end_frame(self, interval):
+        sample = self._sample
+        drawer = self.manager.drawer
+        sample["interval"] = interval
+        sample["show"] = drawer.show_time if drawer.shows != self._shows else 0.0
+        sample["current"] = self.manager.estimated_current
+        self._shows = drawer.shows
+        self.index = (self.index + 1) % len(self.samples)
+        self.frames += 1
+
+        if self.profiling != (self._profiler is not None):
+            self._toggle_profiler()
+        if self.dump_path is not None:
+            now = sample["time"]
+            if self._next_dump is None:
+                self._next_dump = now + self.dump_interval
+            elif now >= self._next_dump:
+                self._next_dump = now + self.dump_interval
+                self.dump(self.dump_path)
+
+    def recent(self, count=None):
+        #the last `count` samples, oldest first
+        filled = min(self.frames, len(self.samples))
+        count = filled if count is None else min(count, filled)
+        return self.samples.take(np.arange(self.index - count, self.index) % len(self.samples))
+
+    def snapshot(self, samples=0):
+        manager = self.manager
+        drawer = manager.drawer
+        stats = manager.frame_stats
+        recent = self.recent()
+        stages = {}
+        for stage in STAGES + ("show",):
+            values = recent[stage]
+            stages[stage] = {"mean_ms": float(values.mean()) * 1000 if len(values) else 0.0,
+                             "max_ms": float(values.max()) * 1000 if len(values) else 0.0}
+        data = {
+            "time": time.time(),
+            "frames": self.frames,
+            "fps": stats.fps,
+            "frame_cost_ms": stats.frame_cost * 1000,
+            "overruns": stats.overruns,
+            "skipped_frames": stats.skipped,
+            "composites": drawer.compositor.composites,
+            "shows": drawer.shows,
+            "skipped_shows": drawer.skipped_shows,
+            "settings_flushes": manager.settings.flush_count,
+            "quality_tier": manager.quality_tier,
+            "estimated_current": manager.estimated_current,
+            "profiling": self._profiler is not None,
+            "startup": manager.startup.marks,
+            "stages": stages,
+        }
+        if manager.network is not None:
+            data["network"] = {"packets": manager.network.packets, "dropped": manager.network.dropped}
+        if samples:
+            names = SAMPLE_DTYPE.names
+            data["samples"] = [dict(zip(names, row)) for row in self.recent(samples).tolist()]
+        return data
+
+    def dump(self, path):
+        #written to a temporary file and swapped in, so readers never see half a dump
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.snapshot(samples=len(self.samples)), f)
+        os.replace(temp_path, path)
+
+    def _toggle_profiler(self):
+        if self.profiling:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            logger.info("profiling started")
+            return
+        self._profiler.disable()
+        if self.profile_path is not None:
+            self._profiler.dump_stats(self.profile_path)
+        report = io.StringIO()
+        pstats.Stats(self._profiler, stream=report).sort_stats("cumulative").print_stats(15)
+        logger.info("profiling stopped\n%s", report.getvalue())
+        self._profiler = None
+
+    def close(self):
+        if self._profiler is not None:
+            self.profiling = False
+            self._toggle_profiler()
+        if self.dump_path is not None and self.frames:
+            self.dump(self.dump_path)
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+
+class MetricsServer:
+    #answers one command per connection on a unix socket with a line of json.
+    #commands: stats, samples, profile start, profile stop
+    def __init__(self, metrics, path):
+        self.metrics = metrics
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(2)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.sock.accept()
+            except OSError:
+                return
+            with connection:
+                connection.settimeout(1.0)
+                try:
+                    command = connection.recv(256).decode().strip() or "stats"
+                    connection.sendall(json.dumps(self.handle(command)).encode() + b"\n")
+                except OSError:
+                    continue
+
+    def handle(self, command):
+        if command == "stats":
+            return self.metrics.snapshot()
+        if command == "samples":
+            return self.metrics.snapshot(samples=len(self.metrics.samples))
+        if command in ("profile start", "profile stop"):
+            self.metrics.profiling = command == "profile start"
+            return {"profiling": self.metrics.profiling}
+        return {"error": f"unknown command {command}"}
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def query(path, command="stats"):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(command.encode())
+        response = b""
+        while not response.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="read metrics from a running disco tie")
+    parser.add_argument("command", choices=["stats", "samples", "profile-start", "profile-stop"], nargs="?",
+                        default="stats")
+    parser.add_argument("-s", "--socket", default="/tmp/disco_tie.sock", help="the manager's metrics socket")
+    args = parser.parse_args(argv)
+    print(json.dumps(query(args.socket, args.command.replace("-", " ")), indent=2))
+
+
+if __name__ == "__main__":
+    main()
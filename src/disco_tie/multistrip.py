@@ -0,0 +1,82 @@
+import numpy as np
+
+from disco_tie.drawer import create_strip
+from disco_tie.output import PixelOutput
+
+#data lines rpi_ws281x can clock out at the same time, each on its own peripheral and dma channel.
+#pcm shares pin 21 with the blinker LED, so it's only usable if that gets moved
+OUTPUT_PINS = {
+    "pwm": {"pin": 18, "dma": 10, "channel": 0},
+    "spi": {"pin": 10, "dma": 11, "channel": 0},
+    "pcm": {"pin": 21, "dma": 12, "channel": 0},
+}
+
+
+class MultiStrip:
+    #one logical strip split over several physical ones, in order.
+    #looks like a single Adafruit_NeoPixel to the drawer, show() refreshes every output at once.
+    #the outputs are started one after another: ws2811_render returns as soon as its dma transfer is running,
+    #so the data lines clock out together without any threads
+    def __init__(self, strips):
+        self.strips = list(strips)
+        self.counts = [strip.numPixels() for strip in self.strips]
+        self.offsets = np.cumsum([0] + self.counts)
+        self.leds = np.zeros(self.offsets[-1], dtype=np.uint32)
+        self.brightness = 255
+        self.show_count = 0
+        self._outputs = [PixelOutput(strip, count) for strip, count in zip(self.strips, self.counts)]
+        self._segments = [self.leds[start:end] for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def begin(self):
+        for strip in self.strips:
+            strip.begin()
+
+    def show(self):
+        self.show_count += 1
+        for strip, output, segment in zip(self.strips, self._outputs, self._segments):
+            output.upload(segment)
+            strip.show()
+
+    def output_for(self, n):
+        #the index of the physical strip led n is on, and its position along that strip
+        index = int(np.searchsorted(self.offsets, n, side="right")) - 1
+        return index, n - int(self.offsets[index])
+
+    def setPixelColor(self, n, color):
+        self.leds[n] = color
+
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.leds[n] = (white << 24) | (red << 16) | (green << 8) | blue
+
+    def getPixelColor(self, n):
+        return int(self.leds[n])
+
+    def getPixels(self):
+        return self.leds
+
+    def numPixels(self):
+        return len(self.leds)
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+        for strip in self.strips:
+            strip.setBrightness(brightness)
+
+    def getBrightness(self):
+        return self.brightness
+
+
+def create_multi_strip(outputs, led_frequency=800_000, strip_factory=None):
+    #outputs is a list of dicts with a led_count and either a named output ("pwm", "spi", "pcm")
+    #or pin/dma/channel given directly, e.g. [{"output": "pwm", "led_count": 74}, {"output": "spi", "led_count": 150}].
+    #strip_factory(led_count, **pins) replaces the real hardware, for testing
+    strips = []
+    for config in outputs:
+        pins = dict(OUTPUT_PINS[config["output"]]) if "output" in config else {}
+        pins.update({key: config[key] for key in ("pin", "dma", "channel") if key in config})
+        if strip_factory is not None:
+            strips.append(strip_factory(config["led_count"], **pins))
+        else:
+            strips.append(create_strip(config["led_count"], led_pin=pins.get("pin", 18), led_frequency=led_frequency,
+                                       dma=pins.get("dma", 10), channel=pins.get("channel", 0)))
+    return MultiStrip(strips)
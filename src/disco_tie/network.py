@@ -0,0 +1,257 @@
+import argparse
+import socket
+import struct
+import time
+
+import numpy as np
+
+E131_PORT = 5568
+RAW_PORT = 5569
+#170 rgb pixels fit in one 512 channel dmx universe
+UNIVERSE_PIXELS = 170
+#raw frames are split into packets that fit in one ethernet frame
+RAW_PACKET_PIXELS = 480
+
+ACN_ID = b"ASC-E1.17\x00\x00\x00"
+E131_HEADER = struct.Struct("!HH12sHI16sHI64sBHBBHHBBHHHB")
+E131_VECTOR_ROOT = 0x00000004
+E131_VECTOR_FRAMING = 0x00000002
+E131_PREVIEW = 0x80
+E131_TERMINATED = 0x40
+#E1.31 6.7.2: a packet up to 20 sequence numbers behind the last one (or a repeat of it) is out of order
+E131_SEQUENCE_WINDOW = 20
+#magic, frame sequence, first pixel, pixel count
+RAW_MAGIC = b"DTIE"
+RAW_HEADER = struct.Struct("!4sIHH")
+
+
+def multicast_group(universe):
+    return f"239.255.{universe >> 8}.{universe & 255}"
+
+
+class NetworkInput:
+    #receives pixel frames from a lighting console (sACN/E1.31) or another tie (raw udp)
+    #and decodes them straight into a float rgb buffer, normally the base layer's pixels.
+    #E1.31 frames start at `universe` and carry 170 pixels per universe
+    def __init__(self, led_count, protocol="e131", port=None, universe=1, host="", multicast=False, timeout=2.0):
+        if protocol not in ("e131", "raw"):
+            raise ValueError(f"Unknown protocol {protocol}, should be e131 or raw")
+        self.led_count = led_count
+        self.protocol = protocol
+        self.universe = universe
+        self.universe_count = -(-led_count // UNIVERSE_PIXELS)
+        self.timeout = timeout
+        if port is None:
+            port = E131_PORT if protocol == "e131" else RAW_PORT
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        if multicast and protocol == "e131":
+            for i in range(self.universe_count):
+                membership = struct.pack("4s4s", socket.inet_aton(multicast_group(universe + i)),
+                                         socket.inet_aton("0.0.0.0"))
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        #every packet is received into the same buffer, and decoded through a view of it
+        self._buffer = bytearray(65536)
+        self._data = np.frombuffer(self._buffer, dtype=np.uint8)
+        #last sequence number seen per universe, or for the whole frame with raw packets
+        self._sequences = np.full(max(self.universe_count, 1), -1, dtype=np.int64)
+        self.last_sequence = None
+        self.last_packet = None
+        self.terminated = False
+        #true if the last poll() wrote anything
+        self.updated = False
+        self.packets = 0
+        self.dropped = 0
+        self.invalid = 0
+
+    def close(self):
+        self.sock.close()
+
+    def active(self, now=None):
+        if self.last_packet is None or self.terminated:
+            return False
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_packet < self.timeout
+
+    def poll(self, pixels, now=None):
+        #decodes every waiting packet into pixels, returns True while the stream is live
+        self.updated = False
+        if self.last_packet is not None and not self.active(now):
+            #whoever sends next starts a new stream, their sequence numbers have nothing to do with the old one
+            self._sequences.fill(-1)
+        while True:
+            try:
+                size = self.sock.recv_into(self._buffer)
+            except BlockingIOError:
+                break
+            if self.protocol == "e131":
+                decoded = self._decode_e131(size, pixels)
+            else:
+                decoded = self._decode_raw(size, pixels)
+            if decoded:
+                self.packets += 1
+                self.updated = True
+                self.terminated = False
+                self.last_packet = time.monotonic()
+        return self.active(now)
+
+    def _newer(self, index, sequence, wrap, window):
+        #sequence numbers wrap, anything less than window behind the last one (or equal to it) is late or a
+        #duplicate. anything further behind is taken as the sender restarting
+        last = self._sequences[index]
+        if last >= 0 and (last - sequence) % wrap < window:
+            self.dropped += 1
+            return False
+        self._sequences[index] = sequence
+        return True
+
+    def _decode_e131(self, size, pixels):
+        buffer = self._buffer
+        if (size < E131_HEADER.size or not buffer.startswith(ACN_ID, 4)
+                or buffer[21] != E131_VECTOR_ROOT or buffer[43] != E131_VECTOR_FRAMING or buffer[125] != 0):
+            self.invalid += 1
+            return False
+        options = buffer[112]
+        if options & E131_PREVIEW:
+            return False
+        index = ((buffer[113] << 8) | buffer[114]) - self.universe
+        if not 0 <= index < self.universe_count:
+            return False
+        if options & E131_TERMINATED:
+            self.terminated = True
+            self._sequences.fill(-1)
+            return False
+        sequence = buffer[111]
+        if not self._newer(index, sequence, 256, E131_SEQUENCE_WINDOW):
+            return False
+        channels = min((buffer[123] << 8 | buffer[124]) - 1, size - E131_HEADER.size)
+        start = index * UNIVERSE_PIXELS
+        count = min(channels // 3, UNIVERSE_PIXELS, self.led_count - start)
+        self._write(E131_HEADER.size, start, count, pixels)
+        self.last_sequence = sequence
+        return True
+
+    def _decode_raw(self, size, pixels):
+        if size < RAW_HEADER.size or not self._buffer.startswith(RAW_MAGIC):
+            self.invalid += 1
+            return False
+        _, sequence, start, count = RAW_HEADER.unpack_from(self._buffer)
+        #every packet of a frame shares its sequence number, so only older frames are dropped
+        last = self._sequences[0]
+        if last >= 0 and sequence != last and not self._newer(0, sequence, 1 << 32, 1 << 31):
+            return False
+        self._sequences[0] = sequence
+        count = min(count, (size - RAW_HEADER.size) // 3, self.led_count - start)
+        if count > 0:
+            self._write(RAW_HEADER.size, start, count, pixels)
+        self.last_sequence = sequence
+        return True
+
+    def _write(self, offset, start, count, pixels):
+        data = self._data[offset:offset + count * 3].reshape(count, 3)
+        np.multiply(data, 1 / 255, out=pixels[start:start + count])
+
+
+class NetworkSender:
+    #sends float rgb frames as sACN/E1.31 or raw udp, for testing the input on localhost
+    #or driving other ties from this one
+    def __init__(self, led_count, protocol="e131", host="127.0.0.1", port=None, universe=1,
+                 source_name="disco tie", priority=100):
+        if protocol not in ("e131", "raw"):
+            raise ValueError(f"Unknown protocol {protocol}, should be e131 or raw")
+        self.led_count = led_count
+        self.protocol = protocol
+        if port is None:
+            port = E131_PORT if protocol == "e131" else RAW_PORT
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+        self.frames = 0
+        #the time each sequence number was last sent, for measuring latency at the other end
+        self.sent_at = np.zeros(256, dtype=np.float64)
+        self._levels = np.empty((led_count, 3), dtype=np.float32)
+        self._packets = []
+        chunk = UNIVERSE_PIXELS if protocol == "e131" else RAW_PACKET_PIXELS
+        cid = b"disco-tie-sender"
+        for i, start in enumerate(range(0, led_count, chunk)):
+            count = min(chunk, led_count - start)
+            if protocol == "e131":
+                header_size = E131_HEADER.size
+                packet = bytearray(header_size + count * 3)
+                length = len(packet)
+                E131_HEADER.pack_into(packet, 0, 0x0010, 0, ACN_ID, 0x7000 | (length - 16), E131_VECTOR_ROOT, cid,
+                                      0x7000 | (length - 38), E131_VECTOR_FRAMING, source_name.encode()[:63],
+                                      priority, 0, 0, 0, universe + i, 0x7000 | (length - 115), 0x02, 0xa1, 0, 1,
+                                      count * 3 + 1, 0)
+            else:
+                header_size = RAW_HEADER.size
+                packet = bytearray(header_size + count * 3)
+                RAW_HEADER.pack_into(packet, 0, RAW_MAGIC, 0, start, count)
+            data = np.frombuffer(packet, dtype=np.uint8, offset=header_size).reshape(count, 3)
+            self._packets.append((packet, data, start, count))
+
+    def close(self):
+        self.sock.close()
+
+    def send(self, rgb):
+        levels = self._levels
+        np.multiply(rgb, 255, out=levels)
+        np.clip(levels, 0, 255, out=levels)
+        np.rint(levels, out=levels)
+        sequence = self.sequence
+        #stamped before sending, the receiver can show the frame before the last packet's sendto returns
+        self.sent_at[sequence & 255] = time.monotonic()
+        for packet, data, start, count in self._packets:
+            np.copyto(data, levels[start:start + count], casting="unsafe")
+            if self.protocol == "e131":
+                packet[111] = sequence & 255
+            else:
+                struct.pack_into("!I", packet, 4, sequence)
+            self.sock.sendto(packet, self.address)
+        self.sequence = (sequence + 1) & 0xffffffff
+        self.frames += 1
+
+
+def main(argv=None):
+    #sends an effect over the network, to drive a tie or test the network input on localhost
+    from disco_tie.analysis import AudioAnalyser
+    from disco_tie.effects import EFFECTS
+
+    effect_names = [effect_class.name for effect_class in EFFECTS]
+    parser = argparse.ArgumentParser(description="send disco tie frames over udp")
+    parser.add_argument("-l", "--leds", type=int, default=74, help="number of LEDs to send")
+    parser.add_argument("-f", "--framerate", type=float, default=30)
+    parser.add_argument("-e", "--effect", choices=effect_names, default="rainbow")
+    parser.add_argument("-p", "--protocol", choices=["e131", "raw"], default="e131")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--universe", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    effect = EFFECTS[effect_names.index(args.effect)](args.leds)
+    audio = AudioAnalyser(led_count=args.leds)
+    audio.update(np.zeros(audio.window, dtype=np.float32), time.monotonic())
+    sender = NetworkSender(args.leds, protocol=args.protocol, host=args.host, port=args.port, universe=args.universe)
+    pixels = np.zeros((args.leds, 3), dtype=np.float32)
+    period = 1 / args.framerate
+    print(f"sending {args.effect} to {sender.address[0]}:{sender.address[1]} over {args.protocol}")
+    deadline = time.monotonic()
+    try:
+        while True:
+            effect.render(pixels, audio, period)
+            sender.send(pixels)
+            deadline += period
+            time.sleep(max(deadline - time.monotonic(), 0))
+    except KeyboardInterrupt:
+        print(f"sent {sender.frames} frames")
+    finally:
+        sender.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+
+#gradient directions for each dimension, picked per lattice corner by the permutation table hash.
+#the 3d set is the 12 cube edge midpoints, with 4 repeated to make 16 so the hash can be masked
+GRAD2 = np.array([(1, 1), (-1, 1), (1, -1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1)], dtype=np.float32)
+GRAD3 = np.array([(1, 1, 0), (-1, 1, 0), (1, -1, 0), (-1, -1, 0),
+                  (1, 0, 1), (-1, 0, 1), (1, 0, -1), (-1, 0, -1),
+                  (0, 1, 1), (0, -1, 1), (0, 1, -1), (0, -1, -1),
+                  (1, 1, 0), (0, -1, 1), (-1, 1, 0), (0, -1, -1)], dtype=np.float32)
+
+
+def _fade(t):
+    #6t^5 - 15t^4 + 10t^3, smooth enough at the lattice points that the noise has no visible grid
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _split(coordinate):
+    #lattice cell (wrapped to the table size) and position inside it
+    cell = np.floor(coordinate)
+    return cell.astype(np.intp) & 255, (coordinate - cell).astype(np.float32)
+
+
+class PerlinNoise:
+    #gradient noise over whole arrays of coordinates at once, roughly in -1.0 to 1.0.
+    #the permutation and gradient tables are built once per seed, so a frame is a handful of numpy calls
+    #whatever the LED count
+    def __init__(self, seed=None):
+        self.reseed(seed)
+
+    def reseed(self, seed):
+        rng = np.random.default_rng(seed)
+        permutation = rng.permutation(256)
+        #doubled so the chained lookups never need wrapping
+        self.perm = np.concatenate([permutation, permutation]).astype(np.intp)
+        self.grad1 = rng.uniform(-1.0, 1.0, 256).astype(np.float32)
+
+    def noise1(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        xi, xf = _split(x)
+        perm = self.perm
+        near = self.grad1[perm[xi]] * xf
+        far = self.grad1[perm[xi + 1]] * (xf - 1)
+        return (near + _fade(xf) * (far - near)) * 2
+
+    def noise2(self, x, y):
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float32), np.asarray(y, dtype=np.float32))
+        xi, xf = _split(x)
+        yi, yf = _split(y)
+        u = _fade(xf)
+        v = _fade(yf)
+        perm = self.perm
+        a = perm[xi] + yi
+        b = perm[xi + 1] + yi
+
+        def corner(hashed, dx, dy):
+            gradient = GRAD2[hashed & 7]
+            return gradient[..., 0] * dx + gradient[..., 1] * dy
+
+        bottom = _lerp(u, corner(perm[a], xf, yf), corner(perm[b], xf - 1, yf))
+        top = _lerp(u, corner(perm[a + 1], xf, yf - 1), corner(perm[b + 1], xf - 1, yf - 1))
+        return _lerp(v, bottom, top)
+
+    def noise3(self, x, y, z):
+        x, y, z = np.broadcast_arrays(np.asarray(x, dtype=np.float32), np.asarray(y, dtype=np.float32),
+                                      np.asarray(z, dtype=np.float32))
+        xi, xf = _split(x)
+        yi, yf = _split(y)
+        zi, zf = _split(z)
+        u = _fade(xf)
+        v = _fade(yf)
+        w = _fade(zf)
+        perm = self.perm
+        a = perm[xi] + yi
+        aa = perm[a] + zi
+        ab = perm[a + 1] + zi
+        b = perm[xi + 1] + yi
+        ba = perm[b] + zi
+        bb = perm[b + 1] + zi
+
+        def corner(hashed, dx, dy, dz):
+            gradient = GRAD3[hashed & 15]
+            return gradient[..., 0] * dx + gradient[..., 1] * dy + gradient[..., 2] * dz
+
+        x0, y0, z0 = xf - 1, yf - 1, zf - 1
+        near = _lerp(v, _lerp(u, corner(perm[aa], xf, yf, zf), corner(perm[ba], x0, yf, zf)),
+                     _lerp(u, corner(perm[ab], xf, y0, zf), corner(perm[bb], x0, y0, zf)))
+        far = _lerp(v, _lerp(u, corner(perm[aa + 1], xf, yf, z0), corner(perm[ba + 1], x0, yf, z0)),
+                    _lerp(u, corner(perm[ab + 1], xf, y0, z0), corner(perm[bb + 1], x0, y0, z0)))
+        return _lerp(w, near, far)
+
+    def fbm(self, *coordinates, octaves=4, lacunarity=2.0, gain=0.5, out=None):
+        #fractal brownian motion: octaves of noise, each at lacunarity times the frequency and gain times the
+        #amplitude of the last, normalised back into roughly -1.0 to 1.0. takes 1 to 3 coordinates
+        noise = (self.noise1, self.noise2, self.noise3)[len(coordinates) - 1]
+        coordinates = [np.asarray(coordinate, dtype=np.float32) for coordinate in coordinates]
+        total = None
+        frequency = 1.0
+        amplitude = 1.0
+        weight = 0.0
+        for octave in range(max(int(octaves), 1)):
+            #each octave is shifted so they don't all share a lattice point at the origin
+            layer = noise(*[coordinate * frequency + octave * 17.31 for coordinate in coordinates])
+            layer *= amplitude
+            if total is None:
+                total = layer
+            else:
+                total += layer
+            weight += amplitude
+            frequency *= lacunarity
+            amplitude *= gain
+        total /= weight
+        if out is not None:
+            np.copyto(out, total)
+            return out
+        return total
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
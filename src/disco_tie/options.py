@@ -1,20 +1,12 @@
-import os
-from enum import Enum
-import json
+import logging
 
-SETTINGS_FILE = os.path.join(__file__.rsplit("/", 1)[0], "settings.json")
+from disco_tie.settings import SettingsStore
 
-DEFAULT_SETTINGS = """
-{
-"settings": {
-    "brightness":10,
-    "mode": 0
-    }
-}"""
+logger = logging.getLogger(__name__)
 
 
 class Option:
-    settings_data = None
+    store = None
     def __init__(self, setting, color, increase_func, decrease_func, init_func, maximum=10, wrap=False):
         self.setting = setting
 
@@ -30,32 +22,29 @@ class Option:
         self.init_setting()
 
     @classmethod
-    def check_settings_file(cls):
-        if cls.settings_data is None:
-            try:
-                with open(SETTINGS_FILE, "r+") as f:
-                    cls.settings_data = json.load(f)
-            except IOError:
-                cls.settings_data = DEFAULT_SETTINGS
-        return  cls.settings_data
+    def get_store(cls):
+        if cls.store is None:
+            cls.store = SettingsStore()
+        return cls.store
 
     def load_setting(self):
-        data = self.check_settings_file()
-        self.value = data["settings"][self.setting]
+        self.value = self.get_store().get(self.setting, 0)
         if self.value < 0:
             self.value = 0
             self.save_setting()
-        if self.value > self.maximum:
+        if self.maximum is not None and self.value > self.maximum:
             self.value = self.maximum
             self.save_setting()
-        print(f"Loaded value: {self.setting}={self.value}")
-        print(self.value)
+        logger.info("loaded value: %s=%s", self.setting, self.value)
 
     def save_setting(self):
-        data = self.check_settings_file()
-        data["settings"][self.setting] = self.value
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(data, f)
+        #only updates the in-memory store, it writes the file itself once the presses stop
+        self.get_store().set(self.setting, self.value)
+
+    def set_value(self, value):
+        self.value = value
+        self.save_setting()
+        self.init_func(self.value)
 
     def init_setting(self):
         self.load_setting()
@@ -68,7 +57,7 @@ class Option:
                 self.value = self.maximum
             else:
                 self.value = 0
-        print(self.value)
+        logger.debug("%s=%s", self.setting, self.value)
         self.save_setting()
         self.increase_func(self.value)
 
@@ -82,9 +71,6 @@ class Option:
                 raise ValueError("Cannot wrap values with no maximum")
             else:
                 self.value = self.maximum
-        print(self.value)
+        logger.debug("%s=%s", self.setting, self.value)
         self.save_setting()
         self.decrease_func(self.value)
-
-
-
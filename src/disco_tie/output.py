@@ -0,0 +1,116 @@
+import ctypes
+from functools import lru_cache
+
+import numpy as np
+
+GAMMA_STEPS = 4096
+
+
+@lru_cache()
+def gamma_table(gamma, steps=GAMMA_STEPS):
+    #linear light output for each of `steps` evenly spaced input levels.
+    #cached, so it's read only to keep one output from changing another's table
+    table = (np.linspace(0.0, 1.0, steps) ** gamma).astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+
+def led_buffer(strip):
+    #returns a uint32 array that shares memory with the strip's LED buffer, or None if it can't be reached
+    leds = getattr(strip, "leds", None)
+    if isinstance(leds, np.ndarray):
+        return leds
+    try:
+        from rpi_ws281x import ws
+        address = int(ws.ws2811_channel_t_leds_get(strip._channel))
+    except (ImportError, AttributeError, TypeError):
+        return None
+    if not address:
+        return None
+    c_buffer = (ctypes.c_uint32 * strip.numPixels()).from_address(address)
+    return np.ctypeslib.as_array(c_buffer)
+
+
+class PixelOutput:
+    def __init__(self, strip, led_count, gamma=None, dither=False):
+        self.strip = strip
+        self.led_count = led_count
+        self.gamma = gamma
+        self.gamma_table = gamma_table(gamma) if gamma not in (None, 1.0) else None
+        self.dither = dither
+        #packed 0x00RRGGBB words, the same layout Color() produces
+        #the ws281x library reorders them to the strip's GRB wire order when it renders
+        self.words = np.zeros(led_count, dtype=np.uint32)
+        self._levels = np.empty((led_count, 3), dtype=np.float32)
+        self._channels = np.empty((led_count, 3), dtype=np.uint32)
+        self._linear = np.empty((led_count, 3), dtype=np.float32)
+        self._gamma_index = np.empty((led_count, 3), dtype=np.intp)
+        #the part of each subpixel's level that got rounded away, carried into the next frame
+        self._error = np.zeros((led_count, 3), dtype=np.float32)
+        self._quantised = np.empty((led_count, 3), dtype=np.float32)
+        self._buffer = None
+        self._shown = None
+
+    def reset(self):
+        #forgets the dither error and the last frame shown, so the next frame is packed and shown from scratch
+        self._error.fill(0.0)
+        self._shown = None
+
+    def linearize(self, rgb):
+        #gamma corrects rgb through the lookup table, returns rgb untouched if there's no gamma
+        if self.gamma_table is None:
+            return rgb
+        steps = len(self.gamma_table) - 1
+        np.multiply(rgb, steps, out=self._linear)
+        np.clip(self._linear, 0, steps, out=self._linear)
+        np.rint(self._linear, out=self._linear)
+        np.copyto(self._gamma_index, self._linear, casting="unsafe")
+        np.take(self.gamma_table, self._gamma_index, out=self._linear)
+        return self._linear
+
+    def pack(self, rgb, scale=1.0):
+        levels = self._levels
+        np.multiply(rgb, scale * 255, out=levels)
+        np.clip(levels, 0, 255, out=levels)
+        if self.dither:
+            #temporal dithering: levels between two steps alternate over frames to average out right
+            levels += self._error
+            np.floor(levels, out=self._quantised)
+            np.minimum(self._quantised, 255, out=self._quantised)
+            np.subtract(levels, self._quantised, out=self._error)
+            levels = self._quantised
+        else:
+            np.rint(levels, out=levels)
+        channels = self._channels
+        np.copyto(channels, levels, casting="unsafe")
+        np.left_shift(channels[:, 0], 16, out=self.words)
+        np.left_shift(channels[:, 1], 8, out=channels[:, 1])
+        np.bitwise_or(self.words, channels[:, 1], out=self.words)
+        np.bitwise_or(self.words, channels[:, 2], out=self.words)
+        return self.words
+
+    def changed(self):
+        #true if the packed words differ from the last frame that was checked
+        if self._shown is None:
+            self._shown = self.words.copy()
+            return True
+        if np.array_equal(self.words, self._shown):
+            return False
+        np.copyto(self._shown, self.words)
+        return True
+
+    def upload(self, words=None):
+        if words is None:
+            words = self.words
+        #numpy backed strips may swap buffers between frames, so only the hardware buffer is cached
+        buffer = getattr(self.strip, "leds", None)
+        if not isinstance(buffer, np.ndarray):
+            if self._buffer is None:
+                self._buffer = led_buffer(self.strip)
+            buffer = self._buffer
+        if buffer is not None:
+            np.copyto(buffer[:len(words)], words)
+            return
+        #no direct access to the LED buffer, fall back to one call per pixel
+        for i, word in enumerate(words.tolist()):
+            self.strip.setPixelColor(i, word)
@@ -0,0 +1,137 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LUT_SIZE = 1024
+
+
+class Palette:
+    #a gradient baked into a fixed size lookup table, sampled across the whole strip in one gather
+    def __init__(self, lut, wrap=True):
+        self.lut = np.ascontiguousarray(lut, dtype=np.float32)
+        self.size = len(self.lut)
+        self.wrap = wrap
+        #difference to the next entry, for interpolated sampling
+        following = np.roll(self.lut, -1, axis=0) if wrap else np.vstack((self.lut[1:], self.lut[-1:]))
+        self._deltas = following - self.lut
+        self._scratch = {}
+
+    @classmethod
+    def from_stops(cls, stops, size=LUT_SIZE, wrap=False):
+        #stops are (position, (r, g, b)) pairs with positions from 0.0 to 1.0
+        stops = sorted(stops, key=lambda stop: stop[0])
+        positions = np.array([stop[0] for stop in stops], dtype=np.float64)
+        colors = np.array([stop[1] for stop in stops], dtype=np.float64)
+        for color in colors:
+            if color.min() < 0 or color.max() > 1.0:
+                raise ValueError(f"Values out of range for color {tuple(color.tolist())}. all channels should be floats between 0.0 and 1.0")
+        x = np.arange(size) / size if wrap else np.linspace(0, 1, size)
+        lut = np.stack([np.interp(x, positions, colors[:, channel]) for channel in range(3)], axis=1)
+        return cls(lut, wrap=wrap)
+
+    @classmethod
+    def from_function(cls, func, size=LUT_SIZE, wrap=True):
+        x = np.arange(size) / size if wrap else np.linspace(0, 1, size)
+        return cls([func(pos) for pos in x.tolist()], wrap=wrap)
+
+    @classmethod
+    def hsv(cls, hue_start=0.0, hue_end=1.0, saturation=1.0, value=1.0, size=LUT_SIZE):
+        wrap = hue_end - hue_start == 1.0
+        x = np.arange(size) / size if wrap else np.linspace(0, 1, size)
+        hue = (hue_start + (hue_end - hue_start) * x) % 1.0 * 6
+        sector = np.floor(hue)
+        fraction = hue - sector
+        p = value * (1 - saturation)
+        q = value * (1 - saturation * fraction)
+        t = value * (1 - saturation * (1 - fraction))
+        v = np.full(size, value)
+        p = np.full(size, p)
+        choices = [
+            (v, t, p),
+            (q, v, p),
+            (p, v, t),
+            (p, q, v),
+            (t, p, v),
+            (v, p, q),
+        ]
+        sector = sector.astype(np.intp) % 6
+        lut = np.zeros((size, 3))
+        for i, channels in enumerate(choices):
+            mask = sector == i
+            for channel in range(3):
+                lut[mask, channel] = channels[channel][mask]
+        return cls(lut, wrap=wrap)
+
+    def _buffers(self, count):
+        buffers = self._scratch.get(count)
+        if buffers is None:
+            buffers = (np.empty(count, dtype=np.float32),
+                       np.empty(count, dtype=np.intp),
+                       np.empty((count, 3), dtype=np.float32))
+            self._scratch[count] = buffers
+        return buffers
+
+    def sample(self, positions, out, interpolate=True):
+        #positions run 0.0 to 1.0 along the gradient, out is (len(positions), 3)
+        position, index, step = self._buffers(len(positions))
+        np.multiply(positions, self.size, out=position)
+        if self.wrap:
+            np.mod(position, self.size, out=position)
+        else:
+            np.clip(position, 0, self.size - 1, out=position)
+        np.floor(position, out=step[:, 0])
+        np.copyto(index, step[:, 0], casting="unsafe")
+        #floating point can round a wrapped position up to exactly size
+        np.minimum(index, self.size - 1, out=index)
+        np.take(self.lut, index, axis=0, out=out)
+        if interpolate:
+            position -= index
+            np.take(self._deltas, index, axis=0, out=step)
+            step *= position[:, None]
+            out += step
+        return out
+
+
+PALETTES = {
+    #the same gradient as manager.color_wheel
+    "wheel": Palette.from_stops([(0.0, (0.0, 1.0, 0.0)),
+                                 (1 / 3, (1.0, 0.0, 0.0)),
+                                 (2 / 3, (0.0, 0.0, 1.0)),
+                                 (1.0, (0.0, 1.0, 0.0))], wrap=True),
+    "hsv": Palette.hsv(),
+    "fire": Palette.from_stops([(0.0, (0.0, 0.0, 0.0)),
+                                (1 / 3, (1.0, 0.0, 0.0)),
+                                (2 / 3, (1.0, 1.0, 0.0)),
+                                (1.0, (1.0, 1.0, 1.0))]),
+    "vu": Palette.from_stops([(0.0, (0.0, 1.0, 0.0)),
+                              (0.5, (1.0, 1.0, 0.0)),
+                              (1.0, (1.0, 0.0, 0.0))]),
+}
+
+
+def _parse_stops(stops):
+    if not isinstance(stops, list) or not stops:
+        raise ValueError("should be a list of at least one [position, r, g, b] stop")
+    parsed = []
+    for stop in stops:
+        if (not isinstance(stop, list) or len(stop) != 4
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+                           for value in stop)):
+            raise ValueError(f"stop {stop!r} should be [position, r, g, b] numbers")
+        parsed.append((stop[0], tuple(stop[1:4])))
+    return parsed
+
+
+def load_palettes(settings):
+    #user palettes live in the settings file as {"name": [[position, r, g, b], ...]}.
+    #a bad one is skipped so a typo in the settings file can't stop the tie starting
+    palettes = dict(PALETTES)
+    for name, stops in settings.get("palettes", {}).items():
+        try:
+            palettes[name] = Palette.from_stops(_parse_stops(stops))
+        except ValueError as e:
+            logger.warning("skipping palette %s: %s", name, e)
+    return palettes
@@ -0,0 +1,256 @@
+import math
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from disco_tie.analysis import AudioAnalyser
+from disco_tie.audio import AudioCapture
+from disco_tie.backends import FakeStrip
+from disco_tie.output import PixelOutput
+from disco_tie.scheduler import FrameScheduler
+
+HEADER_BYTES = 64
+#rms, envelope, onset, beat count, bpm, flux, then one value per band
+FEATURE_FIELDS = ("rms", "envelope", "onset", "beat_count", "bpm", "flux")
+#frames shown, total latency, worst latency, total show time, last sequence shown
+OUTPUT_STATS = 5
+
+
+class SharedDoubleBuffer:
+    #two slots in shared memory. the writer fills the slot the reader isn't on and then bumps the sequence number;
+    #readers use the slot for the latest sequence and check afterwards that it wasn't overwritten while they read
+    def __init__(self, shape, dtype, name=None):
+        dtype = np.dtype(dtype)
+        self.shape = shape
+        self.dtype = dtype
+        self.slot_bytes = int(np.prod(shape)) * dtype.itemsize
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=HEADER_BYTES + 2 * self.slot_bytes)
+        self.name = self.shm.name
+        self.owner = create
+        self._sequence = np.ndarray(1, dtype=np.int64, buffer=self.shm.buf)
+        self._times = np.ndarray(2, dtype=np.float64, buffer=self.shm.buf, offset=8)
+        self.stats = np.ndarray(OUTPUT_STATS, dtype=np.float64, buffer=self.shm.buf, offset=24)
+        self.slots = [np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=HEADER_BYTES + i * self.slot_bytes)
+                      for i in range(2)]
+        if create:
+            self._sequence[0] = 0
+            self._times[:] = 0
+            self.stats[:] = 0
+
+    @property
+    def sequence(self):
+        return int(self._sequence[0])
+
+    def write_slot(self):
+        return self.slots[(self.sequence + 1) % 2]
+
+    def publish(self, timestamp=None):
+        sequence = self.sequence + 1
+        self._times[sequence % 2] = time.monotonic() if timestamp is None else timestamp
+        self._sequence[0] = sequence
+
+    def latest(self):
+        sequence = self.sequence
+        return sequence, self.slots[sequence % 2], float(self._times[sequence % 2])
+
+    def intact(self, sequence):
+        #false if anything has been published since `sequence`. once the writer has published the next one,
+        #its following write_slot() is the slot read for `sequence`, so that's already too late to trust the copy
+        return self.sequence == sequence
+
+    def close(self):
+        self._sequence = self._times = self.stats = None
+        self.slots = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedStrip(FakeStrip):
+    #render side of the pipeline: its leds are always the free slot of the shared frame buffer
+    def __init__(self, frames, ready):
+        self.frames = frames
+        self.ready = ready
+        self.brightness = 255
+        self.show_count = 0
+
+    @property
+    def leds(self):
+        return self.frames.write_slot()
+
+    def show(self):
+        self.show_count += 1
+        self.frames.publish()
+        self.ready.set()
+
+
+class SharedAudioFeatures:
+    #the AudioAnalyser interface, read from the analysis process's shared buffer
+    def __init__(self, features, band_count, led_count):
+        self.features = features
+        self.band_count = band_count
+        self.led_count = led_count
+        self.band_for_led = (np.arange(led_count) * band_count // led_count).astype(np.intp)
+        self._values = np.zeros(len(FEATURE_FIELDS) + band_count, dtype=np.float64)
+        self.bands = np.zeros(band_count, dtype=np.float32)
+        self.rms = 0.0
+        self.envelope = 0.0
+        self.onset = False
+        self.beat = False
+        self.bpm = 0.0
+        self.flux = 0.0
+        self._beat_count = 0
+
+    def update(self, samples=None, now=None):
+        sequence, slot, _ = self.features.latest()
+        np.copyto(self._values, slot)
+        if not self.features.intact(sequence):
+            return
+        rms, envelope, onset, beat_count, bpm, flux = self._values[:len(FEATURE_FIELDS)].tolist()
+        self.rms = rms
+        self.envelope = envelope
+        self.onset = bool(onset)
+        #the analyser may run faster than frames are drawn, so beats are counted rather than flagged
+        self.beat = int(beat_count) != self._beat_count
+        self._beat_count = int(beat_count)
+        self.bpm = bpm
+        self.flux = flux
+        self.bands[:] = self._values[len(FEATURE_FIELDS):]
+
+    def led_levels(self, out):
+        return np.take(self.bands, self.band_for_led, out=out)
+
+
+def _audio_stage(source, features_name, band_count, led_count, window, framerate, stop):
+    features = SharedDoubleBuffer((len(FEATURE_FIELDS) + band_count,), np.float64, name=features_name)
+    capture = AudioCapture(source)
+    analyser = AudioAnalyser(sample_rate=source.sample_rate, window=window, band_count=band_count,
+                             led_count=led_count)
+    scheduler = FrameScheduler(framerate, log_interval=0)
+    capture.start()
+    beat_count = 0
+    scheduler.start()
+    try:
+        while not stop.is_set():
+            analyser.update(capture.latest(window), time.monotonic())
+            beat_count += analyser.beat
+            slot = features.write_slot()
+            slot[:len(FEATURE_FIELDS)] = (analyser.rms, analyser.envelope, analyser.onset, beat_count,
+                                          analyser.bpm, analyser.flux)
+            slot[len(FEATURE_FIELDS):] = analyser.bands
+            features.publish()
+            scheduler.wait()
+    finally:
+        capture.stop()
+        features.close()
+
+
+def _output_stage(strip_factory, frames_name, led_count, ready, stop):
+    frames = SharedDoubleBuffer((led_count,), np.uint32, name=frames_name)
+    strip = strip_factory()
+    strip.begin()
+    output = PixelOutput(strip, led_count)
+    shown = 0
+    try:
+        while not stop.is_set():
+            if not ready.wait(0.1):
+                continue
+            ready.clear()
+            sequence, slot, published = frames.latest()
+            if sequence == shown:
+                continue
+            output.upload(slot)
+            if not frames.intact(sequence):
+                #the renderer lapped us mid copy, take the newer frame instead
+                ready.set()
+                continue
+            show_start = time.monotonic()
+            strip.show()
+            now = time.monotonic()
+            shown = sequence
+            latency = now - published
+            frames.stats[0] += 1
+            frames.stats[1] += latency
+            frames.stats[2] = max(frames.stats[2], latency)
+            frames.stats[3] += now - show_start
+            frames.stats[4] = sequence
+    finally:
+        frames.close()
+
+
+class Pipeline:
+    #runs audio analysis and the strip output in their own processes, leaving this one to render.
+    #frames and features move between them through double buffered shared memory
+    def __init__(self, led_count, strip_factory, audio_source=None, band_count=24, window=1024, framerate=30):
+        self.led_count = led_count
+        context = multiprocessing.get_context("fork")
+        self.stop_event = context.Event()
+        self.ready = context.Event()
+        self.frames = SharedDoubleBuffer((led_count,), np.uint32)
+        self.strip = SharedStrip(self.frames, self.ready)
+        self.stats = self.frames.stats
+        self.processes = [context.Process(target=_output_stage, name="disco-tie-output", daemon=True,
+                                          args=(strip_factory, self.frames.name, led_count, self.ready,
+                                                self.stop_event))]
+        self.features = None
+        self.audio_features = None
+        #stop() can be called from the power button's thread and the main loop at once
+        self._stop_lock = threading.Lock()
+        self.stopped = False
+        if audio_source is not None:
+            self.features = SharedDoubleBuffer((len(FEATURE_FIELDS) + band_count,), np.float64)
+            self.audio_features = SharedAudioFeatures(self.features, band_count, led_count)
+            self.processes.append(context.Process(target=_audio_stage, name="disco-tie-audio", daemon=True,
+                                                  args=(audio_source, self.features.name, band_count, led_count,
+                                                        window, framerate, self.stop_event)))
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    @property
+    def frames_shown(self):
+        return int(self.stats[0])
+
+    @property
+    def mean_latency(self):
+        shown = self.stats[0]
+        return self.stats[1] / shown if shown else math.nan
+
+    @property
+    def max_latency(self):
+        return float(self.stats[2])
+
+    @property
+    def show_time(self):
+        shown = self.stats[0]
+        return self.stats[3] / shown if shown else math.nan
+
+    def stop(self, timeout=0.5):
+        with self._stop_lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            self._stop(timeout)
+
+    def _stop(self, timeout):
+        #give the output process a moment to show the last frame, it's usually the strip being cleared
+        deadline = time.monotonic() + timeout
+        while self.stats[4] < self.frames.sequence and time.monotonic() < deadline:
+            if not self.processes[0].is_alive():
+                break
+            time.sleep(0.001)
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        #keep the output stats readable once the shared memory is gone
+        self.stats = self.stats.copy()
+        self.frames.close()
+        if self.features is not None:
+            self.features.close()
@@ -0,0 +1,69 @@
+import math
+import time
+
+import numpy as np
+
+MAX_CURRENT = 800
+SUBPIXEL_CURRENT = 15
+#mA drawn by a fully lit red, green and blue subpixel
+CHANNEL_CURRENT = (SUBPIXEL_CURRENT, SUBPIXEL_CURRENT, SUBPIXEL_CURRENT)
+#mA each LED's controller draws even when dark
+IDLE_CURRENT = 0.6
+
+
+class PowerLimiter:
+    #estimates the strip's current from the frame and scales brightness to stay inside the supply budget.
+    #the scale drops straight away when the budget is exceeded and eases back up, so it doesn't flicker at the limit
+    def __init__(self, led_count, budget=MAX_CURRENT, channel_current=CHANNEL_CURRENT, idle_current=IDLE_CURRENT,
+                 release=1.0):
+        self.led_count = led_count
+        self.budget = budget
+        self.channel_current = np.array(channel_current, dtype=np.float32)
+        self.idle_current = idle_current
+        self.release = release
+        self.scale = 1.0
+        self.target = 1.0
+        self.estimated_current = 0.0
+        self.peak_current = 0.0
+        self.charge_used = 0.0
+        self._channel_sums = np.zeros(3, dtype=np.float32)
+        self._last_time = None
+
+    def reset(self):
+        #back to full brightness with no easing in progress. the peak and charge totals are kept
+        self.scale = 1.0
+        self.target = 1.0
+        self._last_time = None
+
+    @property
+    def settling(self):
+        return self.scale < self.target
+
+    def update(self, rgb, brightness, now=None):
+        #returns the brightness multiplier to apply to this frame
+        if now is None:
+            now = time.monotonic()
+        dt = 0.0 if self._last_time is None else now - self._last_time
+        self._last_time = now
+
+        np.sum(rgb, axis=0, out=self._channel_sums)
+        idle = self.idle_current * self.led_count
+        drive = float(np.dot(self._channel_sums, self.channel_current)) * brightness
+        available = self.budget - idle
+        if drive <= available:
+            self.target = 1.0
+        else:
+            self.target = max(available, 0.0) / drive
+
+        if self.target <= self.scale or self.release <= 0:
+            self.scale = self.target
+        else:
+            self.scale += (self.target - self.scale) * (1 - math.exp(-dt / self.release))
+            if self.target - self.scale < 1e-3:
+                self.scale = self.target
+
+        self.estimated_current = drive * self.scale + idle
+        self.peak_current = max(self.peak_current, self.estimated_current)
+        #running total in mAh, for sizing batteries
+        self.charge_used += self.estimated_current * dt / 3600
+        return self.scale
@@ -0,0 +1,265 @@
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from disco_tie.backends import NullStrip, RecordingStrip
+from disco_tie.inputs import LONG_PRESS, PRESS, RELEASE, REPEAT, ButtonEvent
+
+MAGIC = b"DTIEREC\0"
+#version 2 added the quality tier each frame was rendered at
+VERSION = 2
+#magic, version, led count, band count, seed, brightness, mode, dither, padded out to 64 bytes.
+#dither came out of the padding, so older recordings read as not dithered
+HEADER = struct.Struct("<8sIIIIIII28x")
+
+BUTTONS = ("options", "plus", "minus")
+KINDS = (PRESS, RELEASE, LONG_PRESS, REPEAT)
+
+
+def record_dtype(led_count, band_count, version=VERSION):
+    #one fixed width record per frame, so a recording can be memory mapped as an array
+    fields = [
+        ("time", "<f8"),
+        ("deltatime", "<f8"),
+        ("inputs", "<u2"),
+        ("onset", "u1"),
+        ("beat", "u1"),
+        ("rms", "<f4"),
+        ("envelope", "<f4"),
+        ("flux", "<f4"),
+        ("bpm", "<f4"),
+        ("bands", "<f4", (band_count,)),
+        ("frame", "u1", (led_count, 3)),
+    ]
+    if version >= 2:
+        fields.insert(5, ("tier", "u1"))
+    return np.dtype(fields)
+
+
+def encode_inputs(events):
+    mask = 0
+    for event in events:
+        if event.button in BUTTONS and event.kind in KINDS:
+            mask |= 1 << (BUTTONS.index(event.button) * len(KINDS) + KINDS.index(event.kind))
+    return mask
+
+
+def decode_inputs(mask, now):
+    events = []
+    for b, button in enumerate(BUTTONS):
+        for k, kind in enumerate(KINDS):
+            if mask & (1 << (b * len(KINDS) + k)):
+                events.append(ButtonEvent(now, button, kind))
+    return events
+
+
+class Recorder:
+    #appends one record per frame: input edges, audio features and the frame that was sent to the strip
+    def __init__(self, path, led_count, band_count, seed=0, brightness=0, mode=0, dither=False):
+        self.path = path
+        self.dtype = record_dtype(led_count, band_count)
+        self._record = np.zeros(1, dtype=self.dtype)
+        self.frames = 0
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, led_count, band_count, seed, brightness, mode, dither))
+
+    def record(self, manager):
+        record = self._record[0]
+        record["time"] = manager.now
+        record["deltatime"] = manager.deltatime
+        record["inputs"] = encode_inputs(manager.input_events)
+        record["tier"] = manager.governor.tier
+        audio = manager.audio_features
+        record["onset"] = audio.onset
+        record["beat"] = audio.beat
+        record["rms"] = audio.rms
+        record["envelope"] = audio.envelope
+        record["flux"] = audio.flux
+        record["bpm"] = audio.bpm
+        #the band count can drop under load, unused bands are recorded as zero
+        band_count = min(len(audio.bands), len(record["bands"]))
+        record["bands"][:band_count] = audio.bands[:band_count]
+        record["bands"][band_count:] = 0
+        words = manager.drawer.output.words
+        frame = record["frame"]
+        np.right_shift(words, 16, out=frame[:, 0], casting="unsafe")
+        np.right_shift(words, 8, out=frame[:, 1], casting="unsafe")
+        np.copyto(frame[:, 2], words, casting="unsafe")
+        self._file.write(self._record.data)
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+
+class Recording:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        magic, version, led_count, band_count, seed, brightness, mode, dither = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a disco tie recording")
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported recording version {version}")
+        self.path = path
+        self.led_count = led_count
+        self.band_count = band_count
+        self.seed = seed
+        self.brightness = brightness
+        self.mode = mode
+        self.dither = bool(dither)
+        self.version = version
+        self.records = np.memmap(path, dtype=record_dtype(led_count, band_count, version), mode="r",
+                                 offset=HEADER.size)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def frames(self):
+        return self.records["frame"]
+
+
+class ReplayAudioFeatures:
+    #the AudioAnalyser interface, fed from recorded feature frames
+    def __init__(self, band_count, led_count):
+        self.band_count = band_count
+        self.led_count = led_count
+        self.band_for_led = (np.arange(led_count) * band_count // led_count).astype(np.intp)
+        self.bands = np.zeros(band_count, dtype=np.float32)
+        self.rms = 0.0
+        self.envelope = 0.0
+        self.flux = 0.0
+        self.bpm = 0.0
+        self.onset = False
+        self.beat = False
+
+    def set_band_count(self, band_count, led_count=None):
+        #the governor can lower the band count mid recording. the recorded bands past it are zero,
+        #this only has to map the LEDs onto the ones that were in use
+        if led_count is not None:
+            self.led_count = led_count
+        self.band_count = min(band_count, len(self.bands))
+        self.band_for_led = (np.arange(self.led_count) * self.band_count // self.led_count).astype(np.intp)
+
+    def load(self, record):
+        self.rms = float(record["rms"])
+        self.envelope = float(record["envelope"])
+        self.flux = float(record["flux"])
+        self.bpm = float(record["bpm"])
+        self.onset = bool(record["onset"])
+        self.beat = bool(record["beat"])
+        np.copyto(self.bands, record["bands"])
+
+    def update(self, samples, now):
+        pass
+
+    def led_levels(self, out):
+        return np.take(self.bands, self.band_for_led, out=out)
+
+
+def replay(recording, manager=None, output_path=None):
+    #drives a headless manager through a recording as fast as it will go. returns the manager,
+    #whose strip holds the replayed frames if it was built here
+    from disco_tie.manager import Manager
+    from disco_tie.settings import SettingsStore
+    if isinstance(recording, str):
+        recording = Recording(recording)
+    if manager is None:
+        manager = Manager(led_count=recording.led_count, strip=RecordingStrip(recording.led_count),
+                          settings=SettingsStore(path=None), dither=recording.dither)
+    manager.get_option("brightness").set_value(recording.brightness)
+    manager.get_option("mode").set_value(recording.mode)
+    manager.reset(recording.seed)
+    features = ReplayAudioFeatures(recording.band_count, recording.led_count)
+    manager.audio_features = features
+    #the quality tiers come from the recording, replaying as fast as possible would otherwise step them down
+    manager.governor.enabled = False
+    tiers = "tier" in recording.records.dtype.names
+    manager.governor.set_tier(0)
+    if output_path is not None:
+        manager.start_recording(output_path, seed=recording.seed)
+    for record in recording.records:
+        manager.now = float(record["time"])
+        manager.deltatime = float(record["deltatime"])
+        for event in decode_inputs(int(record["inputs"]), manager.now):
+            manager.inputs.push(event)
+        manager._get_inputs()
+        features.load(record)
+        if tiers and record["tier"] != manager.governor.tier:
+            manager.governor.set_tier(int(record["tier"]))
+        manager.update()
+        manager._draw()
+        if manager.recorder is not None:
+            manager.recorder.record(manager)
+    manager.stop_recording()
+    return manager
+
+
+def compare(frames, expected):
+    #index of the first frame that differs, or None if they all match
+    count = min(len(frames), len(expected))
+    for i in range(count):
+        if not np.array_equal(frames[i], expected[i]):
+            return i
+    if len(frames) != len(expected):
+        return count
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="record and replay disco tie sessions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record a headless session using the synthetic audio source")
+    record_parser.add_argument("path")
+    record_parser.add_argument("-n", "--frames", type=int, default=300)
+    record_parser.add_argument("-l", "--leds", type=int, default=72)
+    record_parser.add_argument("-m", "--mode", type=int, default=0)
+    replay_parser = subparsers.add_parser("replay", help="replay a recording headless at full speed")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("-o", "--output", help="record the replayed session to this file")
+    compare_parser = subparsers.add_parser("compare", help="compare the output frames of two recordings")
+    compare_parser.add_argument("path")
+    compare_parser.add_argument("expected")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        from disco_tie.audio import SyntheticSource
+        from disco_tie.manager import Manager
+        from disco_tie.settings import SettingsStore
+        manager = Manager(led_count=args.leds, strip=NullStrip(args.leds), audio_source=SyntheticSource(),
+                          settings=SettingsStore(path=None))
+        manager.get_option("mode").set_value(args.mode)
+        manager.start_recording(args.path)
+        draw = manager._draw
+
+        def counted_draw():
+            draw()
+            if manager.recorder.frames + 1 >= args.frames:
+                manager.running = False
+
+        manager._draw = counted_draw
+        manager.run()
+        manager.audio.stop()
+        print(f"recorded {args.frames} frames to {args.path}")
+    elif args.command == "replay":
+        recording = Recording(args.path)
+        start = time.perf_counter()
+        replay(recording, output_path=args.output)
+        elapsed = time.perf_counter() - start
+        print(f"replayed {len(recording)} frames in {elapsed:.3f} s ({len(recording) / elapsed:.1f} fps)")
+    elif args.command == "compare":
+        frames = Recording(args.path).frames
+        expected = Recording(args.expected).frames
+        mismatch = compare(frames, expected)
+        if mismatch is None:
+            print(f"all {len(frames)} frames match")
+        else:
+            print(f"frames differ from frame {mismatch}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import logging
+import math
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class FrameStats:
+    #rolling frame timing over the last `window` frames
+    def __init__(self, window=120):
+        self.intervals = deque(maxlen=window)
+        self.costs = deque(maxlen=window)
+        self.frames = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    def add(self, interval, cost):
+        self.frames += 1
+        self.intervals.append(interval)
+        self.costs.append(cost)
+
+    @property
+    def frame_time(self):
+        return sum(self.intervals) / len(self.intervals) if self.intervals else 0.0
+
+    @property
+    def frame_cost(self):
+        return sum(self.costs) / len(self.costs) if self.costs else 0.0
+
+    @property
+    def jitter(self):
+        if len(self.intervals) < 2:
+            return 0.0
+        mean = self.frame_time
+        return math.sqrt(sum((interval - mean) ** 2 for interval in self.intervals) / len(self.intervals))
+
+    @property
+    def fps(self):
+        frame_time = self.frame_time
+        return 1 / frame_time if frame_time > 0 else 0.0
+
+    def summary(self):
+        return (f"fps {self.fps:.1f}, frame {self.frame_time * 1000:.2f} ms, cost {self.frame_cost * 1000:.2f} ms, "
+                f"jitter {self.jitter * 1000:.2f} ms, overruns {self.overruns}, skipped {self.skipped}")
+
+
+class FrameScheduler:
+    #paces frames against absolute deadlines on the monotonic clock, so sleep overshoot
+    #doesn't accumulate and wall clock jumps (ntp on a pi with no rtc) can't stall the loop.
+    #a late frame either skips the missed slots ("skip") or runs the next few back to back ("catchup")
+    def __init__(self, framerate=30, policy="skip", max_catchup=2, spin_time=0.0, stats_window=120,
+                 log_interval=10.0):
+        if policy not in ("skip", "catchup"):
+            raise ValueError(f"Unknown frame policy {policy}")
+        self.framerate = framerate
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.spin_time = spin_time
+        self.log_interval = log_interval
+        self.stats = FrameStats(stats_window)
+        self.deadline = None
+        self.frame_start = None
+        self._catchup = 0
+        self._next_log = None
+
+    @property
+    def framerate(self):
+        return self._framerate
+
+    @framerate.setter
+    def framerate(self, framerate):
+        self._framerate = framerate
+        self.period = 1 / framerate
+
+    def start(self):
+        now = time.monotonic()
+        self.frame_start = now
+        self.deadline = now + self.period
+        self._next_log = now + self.log_interval if self.log_interval else None
+
+    def wait(self):
+        #call at the end of each frame, returns the time since the previous frame started
+        if self.deadline is None:
+            self.start()
+        now = time.monotonic()
+        cost = now - self.frame_start
+        if now > self.deadline:
+            self.stats.overruns += 1
+            missed = int((now - self.deadline) / self.period) if self.period else 0
+            if self.policy == "catchup" and self._catchup < self.max_catchup:
+                self._catchup += 1
+                self.deadline += self.period
+            else:
+                self._catchup = 0
+                self.stats.skipped += missed
+                self.deadline += (missed + 1) * self.period
+        else:
+            self._catchup = 0
+            self._sleep_until(self.deadline)
+            self.deadline += self.period
+
+        frame_start = time.monotonic()
+        interval = frame_start - self.frame_start
+        self.frame_start = frame_start
+        self.stats.add(interval, cost)
+        if self._next_log is not None and frame_start >= self._next_log:
+            self._next_log = frame_start + self.log_interval
+            logger.info(self.stats.summary())
+        return interval
+
+    def _sleep_until(self, deadline):
+        remaining = deadline - time.monotonic() - self.spin_time
+        if remaining > 0:
+            time.sleep(remaining)
+        #spin the last stretch, sleep() on a pi can overshoot by a millisecond or more
+        while time.monotonic() < deadline:
+            pass
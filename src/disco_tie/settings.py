@@ -0,0 +1,110 @@
+import copy
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "settings.json")
+
+#setting name: (type, default)
+SCHEMA = {
+    "brightness": (int, 10),
+    "mode": (int, 0),
+    "palette": (str, "wheel"),
+    "palettes": (dict, {}),
+}
+
+DEFAULT_SETTINGS = {"settings": {name: default for name, (_, default) in SCHEMA.items()}}
+
+
+class SettingsStore:
+    #settings live in memory; changes mark the store dirty and are written out once things go quiet,
+    #replacing the file atomically so a power cut mid-write can't leave it half written.
+    #a store with no path is never written, for headless replays and tests
+    def __init__(self, path=SETTINGS_FILE, schema=SCHEMA, flush_delay=5.0):
+        self.path = path
+        self.schema = schema
+        self.flush_delay = flush_delay
+        self.dirty = False
+        self.flush_count = 0
+        self._lock = threading.Lock()
+        #the timer's flush and close() can overlap, only one of them writes the temporary file at a time
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self.data = self._load()
+
+    def _load(self):
+        if self.path is None:
+            return self._validate({})
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f).get("settings", {})
+        except (IOError, ValueError, AttributeError):
+            raw = {}
+        return self._validate(raw)
+
+    def _validate(self, raw):
+        if not isinstance(raw, dict):
+            raw = {}
+        data = dict(raw)
+        for name, (setting_type, default) in self.schema.items():
+            value = raw.get(name, default)
+            if not self._valid(value, setting_type):
+                logger.warning("invalid value %r for setting %s, using %r", value, name, default)
+                value = default
+            data[name] = copy.deepcopy(value)
+        return data
+
+    @staticmethod
+    def _valid(value, setting_type):
+        if setting_type is int and isinstance(value, bool):
+            return False
+        return isinstance(value, setting_type)
+
+    def get(self, name, default=None):
+        return self.data.get(name, default)
+
+    def set(self, name, value):
+        if name in self.schema and not self._valid(value, self.schema[name][0]):
+            raise TypeError(f"Setting {name} should be of type {self.schema[name][0].__name__}, not {type(value).__name__}")
+        with self._lock:
+            if self.data.get(name) == value:
+                return
+            self.data[name] = value
+            self.dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self.dirty or self.path is None:
+                    return
+                contents = json.dumps({"settings": self.data})
+                self.dirty = False
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    f.write(contents)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                #left dirty so the next flush, or close(), tries again
+                with self._lock:
+                    self.dirty = True
+                logger.warning("couldn't save settings to %s: %s", self.path, e)
+                return
+            self.flush_count += 1
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
@@ -0,0 +1,68 @@
+import threading
+
+
+class SimButton:
+    #mimics the parts of gpiozero.Button the tie uses, driven by press()/release()
+    def __init__(self, pin=None, hold_time=1):
+        self.pin = pin
+        self.hold_time = hold_time
+        self.is_pressed = False
+        self.is_held = False
+        self.when_pressed = None
+        self.when_released = None
+        self.when_held = None
+        self._hold_timer = None
+
+    def press(self):
+        if self.is_pressed:
+            return
+        self.is_pressed = True
+        if self.when_held is not None:
+            self._hold_timer = threading.Timer(self.hold_time, self._hold)
+            self._hold_timer.daemon = True
+            self._hold_timer.start()
+        if self.when_pressed is not None:
+            self.when_pressed()
+
+    def release(self):
+        if not self.is_pressed:
+            return
+        self.is_pressed = False
+        self.is_held = False
+        if self._hold_timer is not None:
+            self._hold_timer.cancel()
+            self._hold_timer = None
+        if self.when_released is not None:
+            self.when_released()
+
+    def _hold(self):
+        if self.is_pressed:
+            self.is_held = True
+            self.when_held()
+
+
+class SimLED:
+    #mimics gpiozero.LED without touching any pins
+    def __init__(self, pin=None):
+        self.pin = pin
+        self.is_lit = False
+        self.blinking = False
+
+    @property
+    def value(self):
+        return int(self.is_lit)
+
+    def on(self):
+        self.blinking = False
+        self.is_lit = True
+
+    def off(self):
+        self.blinking = False
+        self.is_lit = False
+
+    def toggle(self):
+        self.is_lit = not self.is_lit
+
+    def blink(self, on_time=1, off_time=1, n=None, background=True):
+        self.blinking = True
+        self.is_lit = True